@@ -0,0 +1,155 @@
+"""
+Cold storage for closed months of attendance_logs.
+
+`python -m app.archive` moves every closed punch from months older than
+ARCHIVE_KEEP_MONTHS into attendance_archive, one segment per calendar month,
+and records each segment's bounds in archive_segments. Open sessions always
+stay in the hot table.
+
+Readers call attendance_source(), which checks the (tiny) segment index and
+only unions the archive in when the requested range overlaps a segment.
+"""
+import argparse
+from datetime import date, datetime, timedelta
+from sqlalchemy import delete, func, insert, literal, select, tuple_, union_all
+from sqlalchemy.orm import Session, aliased
+from .config import settings
+from .models import ArchiveSegment, AttendanceArchive, AttendanceLog
+
+COLUMNS = (
+    "id", "user_id", "clock_in", "clock_out",
+    "latitude_in", "longitude_in", "latitude_out", "longitude_out",
+    "site_id_in", "site_id_out",
+)
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def next_month(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+def default_cutoff(today: date | None = None) -> date:
+    """First month that stays hot: ARCHIVE_KEEP_MONTHS whole months before the current one."""
+    cutoff = month_start(today or datetime.utcnow().date())
+    for _ in range(settings.ARCHIVE_KEEP_MONTHS):
+        cutoff = date(cutoff.year - 1, 12, 1) if cutoff.month == 1 else date(cutoff.year, cutoff.month - 1, 1)
+    return cutoff
+
+def _overlaps_archive(db: Session, start_dt: datetime | None, end_dt: datetime | None) -> bool:
+    query = db.query(literal(1)).select_from(ArchiveSegment)
+    if start_dt is not None:
+        query = query.filter(ArchiveSegment.last_clock_in >= start_dt)
+    if end_dt is not None:
+        query = query.filter(ArchiveSegment.first_clock_in < end_dt)
+    return db.query(query.exists()).scalar()
+
+def attendance_source(db: Session, start_dt: datetime | None = None, end_dt: datetime | None = None,
+                      user_id: int | None = None):
+    """
+    Return an entity to query punches from in [start_dt, end_dt): AttendanceLog
+    itself when no archived segment overlaps the range, otherwise an alias of it
+    over `hot UNION ALL archive` with the range (and user) filters pushed into
+    both branches. Callers use it exactly like AttendanceLog.
+    """
+    if not _overlaps_archive(db, start_dt, end_dt):
+        return AttendanceLog
+
+    branches = []
+    for model in (AttendanceLog, AttendanceArchive):
+        stmt = select(*(getattr(model, c) for c in COLUMNS))
+        if start_dt is not None:
+            stmt = stmt.where(model.clock_in >= start_dt)
+        if end_dt is not None:
+            stmt = stmt.where(model.clock_in < end_dt)
+        if user_id is not None:
+            stmt = stmt.where(model.user_id == user_id)
+        branches.append(stmt)
+    return aliased(AttendanceLog, union_all(*branches).subquery("attendance_all"))
+
+def archived_ids(db: Session, keys: list[tuple[int, datetime]]) -> dict:
+    """{(user_id, clock_in): id} of the given punches that were already moved to the archive."""
+    if not keys or not _overlaps_archive(db, min(k[1] for k in keys), max(k[1] for k in keys) + timedelta(microseconds=1)):
+        return {}
+    return {
+        (uid, ci): row_id
+        for row_id, uid, ci in db.query(AttendanceArchive.id, AttendanceArchive.user_id, AttendanceArchive.clock_in)
+        .filter(tuple_(AttendanceArchive.user_id, AttendanceArchive.clock_in).in_(keys))
+    }
+
+def archive_month(db: Session, month: date) -> int:
+    """
+    Move the closed punches of one month into the archive in a single
+    transaction. Returns the number of rows moved.
+    """
+    start_dt = datetime.combine(month_start(month), datetime.min.time())
+    end_dt = datetime.combine(next_month(month), datetime.min.time())
+    closed = (
+        AttendanceLog.clock_in >= start_dt,
+        AttendanceLog.clock_in < end_dt,
+        AttendanceLog.clock_out != None,
+    )
+    # One statement picks the rows and removes them, so a session closed by a
+    # concurrent commit is either moved whole or left hot, never deleted unarchived
+    rows = [dict(zip(COLUMNS, row)) for row in db.execute(
+        delete(AttendanceLog).where(*closed).returning(*(getattr(AttendanceLog, c) for c in COLUMNS))
+    )]
+    if not rows:
+        return 0
+    db.execute(insert(AttendanceArchive), rows)
+    count = len(rows)
+    first_in = min(r["clock_in"] for r in rows)
+    last_in = max(r["clock_in"] for r in rows)
+    min_id = min(r["id"] for r in rows)
+    max_id = max(r["id"] for r in rows)
+
+    segment = db.get(ArchiveSegment, month_start(month))
+    if segment is None:
+        db.add(ArchiveSegment(
+            month=month_start(month), row_count=count, first_clock_in=first_in, last_clock_in=last_in,
+            min_id=min_id, max_id=max_id, archived_at=datetime.utcnow(),
+        ))
+    else:
+        # Late punches (offline sync, closed stragglers) archived on a later run
+        segment.row_count += count
+        segment.first_clock_in = min(segment.first_clock_in, first_in)
+        segment.last_clock_in = max(segment.last_clock_in, last_in)
+        segment.min_id = min(segment.min_id, min_id)
+        segment.max_id = max(segment.max_id, max_id)
+        segment.archived_at = datetime.utcnow()
+    db.commit()
+    return count
+
+def archive_before(db: Session, cutoff: date) -> dict[date, int]:
+    """Archive every month that starts before `cutoff`. Returns {month: rows moved}."""
+    oldest = db.query(func.min(AttendanceLog.clock_in)).filter(AttendanceLog.clock_out != None).scalar()
+    moved: dict[date, int] = {}
+    if oldest is None:
+        return moved
+    month = month_start(oldest.date())
+    while month < month_start(cutoff):
+        count = archive_month(db, month)
+        if count:
+            moved[month] = count
+        month = next_month(month)
+    return moved
+
+def main(argv=None) -> None:
+    from .database import Base, SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Move closed months of attendance_logs into the archive")
+    parser.add_argument("--before", help="archive months before this one, YYYY-MM (default: keep ARCHIVE_KEEP_MONTHS)")
+    args = parser.parse_args(argv)
+    cutoff = datetime.strptime(args.before, "%Y-%m").date() if args.before else default_cutoff()
+
+    Base.metadata.create_all(bind=engine, tables=[AttendanceArchive.__table__, ArchiveSegment.__table__])
+    db = SessionLocal()
+    try:
+        moved = archive_before(db, cutoff)
+        for month, count in moved.items():
+            print(f"{month:%Y-%m}: archived {count} rows")
+        print(f"Archived {sum(moved.values())} rows from {len(moved)} months before {cutoff:%Y-%m}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
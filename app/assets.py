@@ -0,0 +1,164 @@
+"""
+Static assets and rendered pages served from memory with strong caching.
+
+Every file under app/web/static is read once, fingerprinted and precompressed
+(gzip, and brotli when the package is installed). Templates link to
+`static_url("css/styles.css")`, which yields `/static/css/styles.<hash>.css`;
+hashed URLs are served `immutable` for a year, original names are still served
+but must revalidate. Both answer If-None-Match with 304.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass, field
+from fastapi import Request
+from fastapi.responses import HTMLResponse, Response
+from fastapi.templating import Jinja2Templates
+from .cache import TTLCache
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+STATIC_DIR = "app/web/static"
+COMPRESSIBLE = {"text/css", "text/javascript", "application/javascript", "application/json", "image/svg+xml", "text/plain"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+@dataclass
+class Asset:
+    content_type: str
+    digest: str
+    bodies: dict[str, bytes] = field(default_factory=dict)  # content-coding ("identity", "br", "gzip") -> bytes
+
+    def etag(self, coding: str) -> str:
+        return f'"{self.digest}"' if coding == "identity" else f'"{self.digest}-{coding}"'
+
+def _hashed_name(rel_path: str, digest: str) -> str:
+    stem, ext = os.path.splitext(rel_path)
+    return f"{stem}.{digest}{ext}"
+
+def _accepted(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        try:
+            if params.startswith("q=") and float(params[2:]) == 0:
+                continue  # explicitly refused
+        except ValueError:
+            pass
+        accepted.add(coding.strip().lower())
+    return accepted
+
+class StaticAssets:
+    """ASGI app mounted at /static in place of StaticFiles."""
+
+    def __init__(self, directory: str = STATIC_DIR, prefix: str = "/static"):
+        self.directory = directory
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._assets: dict[str, tuple[Asset, bool]] = {}  # request path -> (asset, immutable)
+        self._urls: dict[str, str] = {}  # original relative path -> hashed URL
+        self._loaded = False
+
+    def load(self) -> int:
+        assets: dict[str, tuple[Asset, bool]] = {}
+        urls: dict[str, str] = {}
+        for root, _, files in os.walk(self.directory):
+            for filename in files:
+                full = os.path.join(root, filename)
+                rel_path = os.path.relpath(full, self.directory).replace(os.sep, "/")
+                with open(full, "rb") as f:
+                    data = f.read()
+                content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+                asset = Asset(content_type, hashlib.sha256(data).hexdigest()[:12], {"identity": data})
+                if content_type in COMPRESSIBLE or content_type.startswith("text/"):
+                    # Keep a compressed copy only when it actually saves bytes
+                    gz = gzip.compress(data, compresslevel=9, mtime=0)
+                    if len(gz) < len(data) * 0.9:
+                        asset.bodies["gzip"] = gz
+                    if brotli is not None:
+                        br = brotli.compress(data, quality=11)
+                        if len(br) < len(data) * 0.9:
+                            asset.bodies["br"] = br
+                hashed = _hashed_name(rel_path, asset.digest)
+                assets[rel_path] = (asset, False)
+                assets[hashed] = (asset, True)
+                urls[rel_path] = f"{self.prefix}/{hashed}"
+        with self._lock:
+            self._assets, self._urls, self._loaded = assets, urls, True
+        return len(urls)
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def url(self, rel_path: str) -> str:
+        """Content-hashed URL for a file under the static directory (plain URL if unknown)."""
+        self.ensure_loaded()
+        return self._urls.get(rel_path.lstrip("/"), f"{self.prefix}/{rel_path.lstrip('/')}")
+
+    async def __call__(self, scope, receive, send):
+        self.ensure_loaded()
+        if scope["method"] not in {"GET", "HEAD"}:
+            response = Response(status_code=405, headers={"Allow": "GET, HEAD"})
+            await response(scope, receive, send)
+            return
+        path, root_path = scope["path"], scope.get("root_path", "")
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        entry = self._assets.get(path.lstrip("/"))
+        if entry is None:
+            await Response("Not Found", status_code=404, media_type="text/plain")(scope, receive, send)
+            return
+        asset, immutable = entry
+        request = Request(scope)
+        accepted = _accepted(request.headers.get("accept-encoding", ""))
+        coding = next((c for c in ("br", "gzip") if c in asset.bodies and c in accepted), "identity")
+        headers = {
+            "ETag": asset.etag(coding),
+            "Cache-Control": IMMUTABLE if immutable else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match == "*" or headers["ETag"] in {tag.strip() for tag in if_none_match.split(",")}:
+            response = Response(status_code=304, headers=headers)
+        elif scope["method"] == "HEAD":
+            headers["Content-Length"] = str(len(asset.bodies[coding]))
+            response = Response(status_code=200, headers=headers, media_type=asset.content_type)
+        else:
+            response = Response(asset.bodies[coding], headers=headers, media_type=asset.content_type)
+        await response(scope, receive, send)
+
+static_assets = StaticAssets()
+
+def register_asset_urls(templates: Jinja2Templates) -> None:
+    templates.env.globals["static_url"] = static_assets.url
+
+# ---------------- RENDERED PAGE CACHE ----------------
+page_cache = TTLCache(maxsize=64, ttl=settings.PAGE_CACHE_TTL_SECONDS)
+
+def cached_page(templates: Jinja2Templates, request: Request, name: str,
+                status_code: int = 200, headers: dict | None = None, **context) -> Response:
+    """
+    Render a template whose output depends only on `context` (never on the
+    user or session), reusing the bytes and ETag across requests.
+    """
+    key = (id(templates), name, status_code, tuple(sorted(context.items())))
+    entry = page_cache.get(key)
+    if entry is None:
+        body = templates.get_template(name).render(request=request, **context).encode("utf-8")
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+        page_cache.set(key, entry)
+    body, etag = entry
+    response_headers = {"ETag": etag, "Cache-Control": REVALIDATE, **(headers or {})}
+    if status_code == 200 and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=response_headers)
+    return HTMLResponse(body, status_code=status_code, headers=response_headers)
@@ -0,0 +1,84 @@
+import asyncio
+from fastapi import APIRouter, Request, Form, Depends
+from fastapi.responses import RedirectResponse
+from starlette.status import HTTP_302_FOUND
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from . import models, database
+from .config import settings
+from .punch_ingest import punch_writer
+from .presence import presence_board
+from .today_state import today_state
+from .rollups import record_clock_in, record_clock_out
+from .geofence import geofences
+from .punches import ALREADY_CLOCKED_IN, clock_in_stmt, clock_out_stmt
+
+# Async versions of the web punch handlers in views.py. main.py includes this
+# router before views.router when DB_ASYNC is enabled, so these take the paths.
+router = APIRouter()
+
+@router.post("/attendance/clock-in")
+async def clock_in(request: Request,
+                   latitude: float | None = Form(None),
+                   longitude: float | None = Form(None),
+                   db: AsyncSession = Depends(database.get_async_db)):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return RedirectResponse("/login", status_code=HTTP_302_FOUND)
+
+    # Web punches are not rejected off-site, but the matched site is recorded
+    site = geofences.match(latitude, longitude)
+    site_id = site.site_id if site else None
+
+    now = datetime.utcnow()
+    if settings.PUNCH_GROUP_COMMIT:
+        try:
+            await asyncio.wrap_future(punch_writer.submit(dict(
+                user_id=user_id, latitude_in=latitude, longitude_in=longitude, clock_in=now,
+                site_id_in=site_id,
+            )))
+        except IntegrityError:
+            # Already clocked in today (double submit)
+            request.session["punch_error"] = ALREADY_CLOCKED_IN
+            return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
+        presence_board.clocked_in(user_id)
+        today_state.clocked_in(user_id, now)
+        database.note_write(request)
+        return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
+
+    try:
+        row = (await db.execute(clock_in_stmt(user_id, now, latitude, longitude, site_id))).first()
+    except IntegrityError:
+        row = None
+    if row is None:
+        await db.rollback()
+        request.session["punch_error"] = ALREADY_CLOCKED_IN
+        return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
+    await db.run_sync(record_clock_in, user_id, now)
+    await db.commit()
+    presence_board.clocked_in(user_id)
+    today_state.clocked_in(user_id, now)
+    database.note_write(request)
+    return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
+
+@router.post("/attendance/clock-out")
+async def clock_out(request: Request,
+                    latitude: float | None = Form(None),
+                    longitude: float | None = Form(None),
+                    db: AsyncSession = Depends(database.get_async_db)):
+    user_id = request.session.get("user_id")
+    if not user_id:
+        return RedirectResponse("/login", status_code=HTTP_302_FOUND)
+
+    site = geofences.match(latitude, longitude)
+    row = (await db.execute(
+        clock_out_stmt(user_id, datetime.utcnow(), latitude, longitude, site.site_id if site else None)
+    )).first()
+    if row:
+        await db.run_sync(record_clock_out, user_id, row.clock_in, row.clock_out)
+        await db.commit()
+        presence_board.clocked_out(user_id)
+        today_state.clocked_out(user_id, row.clock_in, row.clock_out)
+        database.note_write(request)
+    return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
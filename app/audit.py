@@ -0,0 +1,167 @@
+"""
+Vectorised geofence audit over historical punches.
+
+Rows are streamed from attendance_logs in chunks, turned into NumPy columns,
+and every fence is tested against the whole chunk at once. Run as a CLI with
+`python -m app.audit --start 2025-01-01 --end 2025-12-31`.
+"""
+import argparse
+import csv
+import sys
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from .archive import attendance_source
+from .config import settings
+from .geofence import Fence
+
+EARTH_RADIUS_M = 6371000.0
+MISSING, OUTSIDE = "missing_coordinates", "outside_fence"
+
+def haversine_meters_np(lat: np.ndarray, lon: np.ndarray, ref_lat: float, ref_lon: float) -> np.ndarray:
+    """Array version of utils.haversine_distance_meters against one reference point."""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(ref_lat)
+    dphi = np.radians(ref_lat - lat)
+    dlambda = np.radians(ref_lon - lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+def _points_in_polygon(lat: np.ndarray, lon: np.ndarray, polygon) -> np.ndarray:
+    inside = np.zeros(lat.shape, dtype=bool)
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if lat_i != lat_j:
+            crosses = (lat_i > lat) != (lat_j > lat)
+            cross_lon = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            inside ^= crosses & (lon < cross_lon)
+        j = i
+    return inside
+
+def inside_any_fence(lat: np.ndarray, lon: np.ndarray, fences: list[Fence]) -> np.ndarray:
+    """
+    Boolean mask of points covered by at least one fence. Each fence first
+    narrows to points inside its bounding box, so exact tests run on few rows.
+    NaN coordinates are never inside.
+    """
+    covered = np.zeros(lat.shape, dtype=bool)
+    for fence in fences:
+        min_lat, min_lon, max_lat, max_lon = fence.bbox()
+        candidates = np.flatnonzero(
+            ~covered & (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        )
+        if candidates.size == 0:
+            continue
+        c_lat, c_lon = lat[candidates], lon[candidates]
+        if fence.kind == "polygon":
+            hit = _points_in_polygon(c_lat, c_lon, fence.polygon)
+        else:
+            hit = haversine_meters_np(c_lat, c_lon, fence.latitude, fence.longitude) <= fence.radius_m
+        covered[candidates[hit]] = True
+    return covered
+
+def run_audit(db: Session, fences: list[Fence], start: date | None = None, end: date | None = None,
+              user_id: int | None = None, max_flagged: int | None = None) -> dict:
+    """
+    Returns {"users": {user_id: counts}, "flagged": [...], "truncated": bool}.
+    Both the clock-in and (when present) clock-out position of every punch is checked.
+    """
+    start_dt = datetime.combine(start, datetime.min.time()) if start else None
+    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time()) if end else None
+    Log = attendance_source(db, start_dt, end_dt, user_id)
+    stmt = select(
+        Log.id, Log.user_id, Log.clock_in, Log.clock_out,
+        Log.latitude_in, Log.longitude_in,
+        Log.latitude_out, Log.longitude_out,
+    )
+    if start_dt:
+        stmt = stmt.where(Log.clock_in >= start_dt)
+    if end_dt:
+        stmt = stmt.where(Log.clock_in < end_dt)
+    if user_id is not None:
+        stmt = stmt.where(Log.user_id == user_id)
+    stmt = stmt.order_by(Log.clock_in, Log.id).execution_options(yield_per=settings.AUDIT_CHUNK_SIZE)
+
+    users: dict[int, dict] = {}
+    flagged: list[dict] = []
+    truncated = False
+    for chunk in db.execute(stmt).partitions():
+        ids, user_ids, clock_ins, clock_outs, lat_in, lon_in, lat_out, lon_out = zip(*chunk)
+        ids = np.array(ids)
+        user_ids = np.array(user_ids)
+        has_out = np.array([c is not None for c in clock_outs])
+
+        reasons = {}
+        for direction, lat, lon, applies in (
+            ("in", lat_in, lon_in, np.ones(len(chunk), dtype=bool)),
+            ("out", lat_out, lon_out, has_out),
+        ):
+            lat = np.array(lat, dtype=float)
+            lon = np.array(lon, dtype=float)
+            missing = applies & (np.isnan(lat) | np.isnan(lon))
+            outside = applies & ~missing & ~inside_any_fence(lat, lon, fences)
+            reasons[direction] = (missing, outside)
+
+        # Per-user counts with bincount over the compacted user index
+        uniq, inverse = np.unique(user_ids, return_inverse=True)
+        counts = {
+            "punches": np.bincount(inverse, minlength=uniq.size),
+            "missing_coordinates": np.bincount(inverse, weights=reasons["in"][0] | reasons["out"][0], minlength=uniq.size),
+            "outside_fence": np.bincount(inverse, weights=reasons["in"][1] | reasons["out"][1], minlength=uniq.size),
+        }
+        for k, uid in enumerate(uniq.tolist()):
+            entry = users.setdefault(uid, {"punches": 0, "missing_coordinates": 0, "outside_fence": 0})
+            for key, values in counts.items():
+                entry[key] += int(values[k])
+
+        if truncated:
+            continue
+        for direction, (missing, outside) in reasons.items():
+            for reason, mask in ((MISSING, missing), (OUTSIDE, outside)):
+                for idx in np.flatnonzero(mask).tolist():
+                    if max_flagged is not None and len(flagged) >= max_flagged:
+                        truncated = True
+                        break
+                    flagged.append({
+                        "attendance_id": int(ids[idx]), "user_id": int(user_ids[idx]),
+                        "clock_in": clock_ins[idx], "direction": direction, "reason": reason,
+                    })
+    flagged.sort(key=lambda f: (f["clock_in"], f["attendance_id"], f["direction"]))
+    return {"users": users, "flagged": flagged, "truncated": truncated}
+
+def main(argv=None) -> None:
+    from .database import SessionLocal
+    from .geofence import geofences
+
+    parser = argparse.ArgumentParser(description="Audit historical punches against the configured geofences")
+    parser.add_argument("--start", help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", help="last day, YYYY-MM-DD")
+    parser.add_argument("--user", type=int, help="only this user_id")
+    parser.add_argument("--flagged-csv", help="write every flagged punch to this CSV file")
+    args = parser.parse_args(argv)
+    start = datetime.strptime(args.start, "%Y-%m-%d").date() if args.start else None
+    end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else None
+
+    geofences.reload(SessionLocal)
+    db = SessionLocal()
+    try:
+        result = run_audit(db, geofences.fences(), start, end, args.user)
+    finally:
+        db.close()
+
+    writer = csv.writer(sys.stdout, lineterminator="\n")
+    writer.writerow(["user_id", "punches", "missing_coordinates", "outside_fence"])
+    for uid, c in sorted(result["users"].items()):
+        writer.writerow([uid, c["punches"], c["missing_coordinates"], c["outside_fence"]])
+    if args.flagged_csv:
+        with open(args.flagged_csv, "w", newline="") as fh:
+            out = csv.writer(fh)
+            out.writerow(["attendance_id", "user_id", "clock_in", "direction", "reason"])
+            for f in result["flagged"]:
+                out.writerow([f["attendance_id"], f["user_id"], f["clock_in"].isoformat(), f["direction"], f["reason"]])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import csv
+import io
+import json
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from .config import settings
+from .models import User
+from .security import hash_passwords_bulk
+
+IMPORT_FIELDS = ("name", "username", "password", "role")
+ALLOWED_ROLES = {"staff", "admin", "db_admin"}
+LOOKUP_CHUNK = 500  # keeps IN (...) lists under driver parameter limits
+
+class ImportFormatError(ValueError):
+    """Raised when an uploaded file cannot be parsed at all."""
+
+def parse_user_rows(data: bytes, filename: str = "") -> list[dict]:
+    """
+    Accept a JSON array of objects or a CSV file with a name,username,password,role header.
+    """
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ImportFormatError("File must be UTF-8 encoded")
+
+    if filename.lower().endswith(".json") or text.lstrip().startswith("["):
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as exc:
+            raise ImportFormatError(f"Invalid JSON: {exc.msg}")
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ImportFormatError("JSON import must be an array of objects")
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        missing = set(IMPORT_FIELDS) - set(reader.fieldnames or [])
+        if missing:
+            raise ImportFormatError(f"CSV header is missing: {', '.join(sorted(missing))}")
+        rows = list(reader)
+
+    if len(rows) > settings.BULK_IMPORT_MAX_ROWS:
+        raise ImportFormatError(f"At most {settings.BULK_IMPORT_MAX_ROWS} rows per import")
+    return [{f: str(r.get(f) or "").strip() for f in IMPORT_FIELDS} for r in rows]
+
+def _validate(row: dict) -> str | None:
+    if not 2 <= len(row["name"]) <= 100:
+        return "name must be 2-100 characters"
+    if not 3 <= len(row["username"]) <= 50:
+        return "username must be 3-50 characters"
+    if not 6 <= len(row["password"]) <= 128:
+        return "password must be 6-128 characters"
+    if row["role"] not in ALLOWED_ROLES:
+        return f"role must be one of {', '.join(sorted(ALLOWED_ROLES))}"
+    return None
+
+def import_users(db: Session, rows: list[dict]) -> dict:
+    """
+    Validate, de-duplicate, hash and insert users. Returns a report of the
+    usernames created and a per-row error list (row numbers are 1-based data rows).
+    """
+    errors: list[dict] = []
+    accepted: list[tuple[int, dict]] = []
+    seen: set[str] = set()
+    for line, row in enumerate(rows, start=1):
+        problem = _validate(row)
+        if not problem and row["username"] in seen:
+            problem = "duplicate username in file"
+        if problem:
+            errors.append({"row": line, "username": row["username"], "error": problem})
+            continue
+        seen.add(row["username"])
+        accepted.append((line, row))
+
+    # One set-based lookup (chunked) instead of a query per row
+    usernames = [row["username"] for _, row in accepted]
+    existing: set[str] = set()
+    for i in range(0, len(usernames), LOOKUP_CHUNK):
+        chunk = usernames[i:i + LOOKUP_CHUNK]
+        existing.update(u for (u,) in db.query(User.username).filter(User.username.in_(chunk)))
+    fresh = []
+    for line, row in accepted:
+        if row["username"] in existing:
+            errors.append({"row": line, "username": row["username"], "error": "username already exists"})
+        else:
+            fresh.append((line, row))
+
+    hashes = hash_passwords_bulk([row["password"] for _, row in fresh])
+
+    created: list[str] = []
+    size = settings.BULK_IMPORT_BATCH_SIZE
+    for i in range(0, len(fresh), size):
+        batch = [
+            (line, {"name": row["name"], "username": row["username"], "password": hashed, "role": row["role"]})
+            for (line, row), hashed in zip(fresh[i:i + size], hashes[i:i + size])
+        ]
+        try:
+            db.execute(insert(User), [values for _, values in batch])
+            db.commit()
+            created.extend(values["username"] for _, values in batch)
+        except IntegrityError:
+            # Lost a race with a concurrent insert; retry this batch row by row
+            db.rollback()
+            for line, values in batch:
+                try:
+                    db.execute(insert(User), [values])
+                    db.commit()
+                    created.append(values["username"])
+                except IntegrityError:
+                    db.rollback()
+                    errors.append({"row": line, "username": values["username"], "error": "username already exists"})
+
+    errors.sort(key=lambda e: e["row"])
+    return {"total": len(rows), "created": created, "errors": errors}
@@ -0,0 +1,61 @@
+"""
+Change feed over users and attendance_logs for downstream sync (payroll).
+
+Both tables are stamped by models.next_change_seq() on insert and update, so a
+consumer that keeps its last cursor only reads rows written since. Each row
+appears once, in its latest state, in (change_seq, kind, id) order. Deletions
+(including archival of closed punches) are not reported.
+
+On PostgreSQL change_seq is the writing transaction's id and a page only reads
+below the snapshot xmin, the oldest transaction still in flight: a transaction
+that commits late (bulk import, long sync, lock wait) holds the feed back
+instead of landing behind a cursor that has already passed it. SQLite
+serializes writers, so every stamped row is already final.
+"""
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+from .fastjson import ATTENDANCE_COLUMNS, ATTENDANCE_FIELDS
+from .models import AttendanceLog, User
+
+# kind -> (model, columns, field names); kinds compare as strings inside the cursor order
+KINDS = {
+    "attendance": (AttendanceLog, ATTENDANCE_COLUMNS, ATTENDANCE_FIELDS),
+    "user": (User, (User.id, User.name, User.username, User.role), ("id", "name", "username", "role")),
+}
+
+def _after(model, kind: str, cursor: tuple[int, str, int] | None):
+    if cursor is None:
+        return model.change_seq != None
+    seq, cursor_kind, row_id = cursor
+    if kind > cursor_kind:
+        return model.change_seq >= seq
+    if kind < cursor_kind:
+        return model.change_seq > seq
+    return or_(model.change_seq > seq, and_(model.change_seq == seq, model.id > row_id))
+
+def read_changes(db: Session, cursor: tuple[int, str, int] | None, limit: int) -> tuple[list[dict], tuple | None, bool]:
+    """
+    Up to `limit` changes after `cursor`, each {"kind", "change_seq", "changed_at", kind: row},
+    the position after the last one (the cursor itself when there are none), and
+    whether more are ready now. Each table is read by keyset on its change_seq
+    index (limit + 1 rows) and the two are merged.
+    """
+    watermark = None
+    if db.get_bind().dialect.name == "postgresql":
+        # Separate statement first: every transaction below it has finished, so later reads see all its rows
+        watermark = db.execute(select(func.txid_snapshot_xmin(func.txid_current_snapshot()))).scalar()
+    entries = []
+    for kind, (model, columns, fields) in KINDS.items():
+        query = db.query(model.change_seq, model.changed_at, *columns).filter(_after(model, kind, cursor))
+        if watermark is not None:
+            query = query.filter(model.change_seq < watermark)
+        for seq, changed_at, *values in query.order_by(model.change_seq.asc(), model.id.asc()).limit(limit + 1):
+            entries.append(((seq, kind, values[0]), changed_at, dict(zip(fields, values))))
+    entries.sort(key=lambda e: e[0])
+
+    items, position = [], cursor
+    for key, changed_at, row in entries[:limit]:
+        seq, kind, _ = key
+        items.append({"kind": kind, "change_seq": seq, "changed_at": changed_at, kind: row})
+        position = key
+    return items, position, len(entries) > limit
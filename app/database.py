@@ -1,7 +1,17 @@
+import itertools
+import logging
+import threading
+import time
+from fastapi import Request
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, DeclarativeBase
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 class Base(DeclarativeBase):
     pass
 
@@ -14,3 +24,139 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# ---------------- READ REPLICAS (optional, DATABASE_REPLICA_URLS) ----------------
+replica_engines = [create_engine(url, pool_pre_ping=True) for url in settings.DATABASE_REPLICA_URLS]
+
+class ReplicaRouter:
+    """
+    Round-robin over replica engines. A replica whose connection check fails is
+    skipped for `retry_seconds`; with none available, reads go to the primary.
+    """
+
+    def __init__(self, engines: list, retry_seconds: float):
+        self.engines = engines
+        self.retry_seconds = retry_seconds
+        self._turn = itertools.count()
+        self._down_until: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def session(self) -> Session:
+        if self.engines:
+            start = next(self._turn)
+            for offset in range(len(self.engines)):
+                index = (start + offset) % len(self.engines)
+                with self._lock:
+                    if self._down_until.get(index, 0) > time.monotonic():
+                        continue
+                db = SessionLocal(bind=self.engines[index])
+                try:
+                    db.connection()  # checkout with pre-ping doubles as the health check
+                    return db
+                except OperationalError as exc:
+                    db.close()
+                    logger.warning("Read replica %d unavailable, skipping for %ss: %s", index, self.retry_seconds, exc.orig)
+                    with self._lock:
+                        self._down_until[index] = time.monotonic() + self.retry_seconds
+        return SessionLocal()
+
+    def status(self) -> list[dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {"replica": i, "healthy": self._down_until.get(i, 0) <= now}
+                for i in range(len(self.engines))
+            ]
+
+replica_router = ReplicaRouter(replica_engines, settings.REPLICA_RETRY_SECONDS)
+
+def note_write(request: Request) -> None:
+    """Pin this web session's reads to the primary for READ_YOUR_WRITES_SECONDS."""
+    if settings.READ_YOUR_WRITES_SECONDS > 0 and "session" in request.scope:
+        request.session["last_write_at"] = time.time()
+
+def _wrote_recently(request: Request) -> bool:
+    if settings.READ_YOUR_WRITES_SECONDS <= 0 or "session" not in request.scope:
+        return False
+    return time.time() - request.session.get("last_write_at", 0) < settings.READ_YOUR_WRITES_SECONDS
+
+def read_session() -> Session:
+    """Session for read-only work on a healthy replica (the primary without replicas)."""
+    return replica_router.session()
+
+def get_read_db(request: Request):
+    """get_db for read-only routes: a replica unless this user wrote moments ago."""
+    db = SessionLocal() if _wrote_recently(request) else read_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def warm_pool(engine, connections: int) -> int:
+    """
+    Open up to `connections` pooled connections (capped at the pool size) and
+    return them to the pool, so the first requests skip connect/auth.
+    """
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        connections = min(connections, size())
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(engine.connect())
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+async def warm_async_pool(engine, connections: int) -> int:
+    size = getattr(engine.pool, "size", None)
+    if callable(size):
+        connections = min(connections, size())
+    opened = []
+    try:
+        for _ in range(connections):
+            opened.append(await engine.connect())
+    finally:
+        for conn in opened:
+            await conn.close()
+    return len(opened)
+
+def dialect_insert(dialect_name: str):
+    """
+    insert() construct with ON CONFLICT support for the given dialect.
+    """
+    if dialect_name == "postgresql":
+        return postgresql.insert
+    if dialect_name == "sqlite":
+        return sqlite.insert
+    raise NotImplementedError(f"ON CONFLICT inserts are not implemented for {dialect_name}")
+
+# ---------------- ASYNC (optional, DB_ASYNC=1) ----------------
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str) -> str:
+    """
+    Map a sync DATABASE_URL onto its async driver, e.g. postgresql:// -> postgresql+asyncpg://.
+    """
+    scheme, sep, rest = url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.DB_ASYNC:
+    async_engine = create_async_engine(
+        settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL),
+        pool_pre_ping=True,
+    )
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("Async database mode is disabled; set DB_ASYNC=1")
+    async with AsyncSessionLocal() as db:
+        yield db
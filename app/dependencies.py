@@ -1,28 +1,66 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from jose import JWTError
-from .database import get_db
+from .cache import TTLCache
+from .config import settings
+from .database import get_db, get_async_db
 from .models import User
 from .schemas import TokenPayload
 from .security import decode_token
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/token")
+API_PREFIX = "/api"
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{API_PREFIX}/users/token")
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
-    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+# username -> detached User snapshot (no password hash), so most requests skip the user lookup
+principal_cache = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=min(settings.PRINCIPAL_CACHE_TTL_SECONDS, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60),
+)
+
+def invalidate_principal(*usernames: str) -> None:
+    for username in usernames:
+        principal_cache.pop(username)
+
+def get_token_payload(token: str = Depends(oauth2_scheme)) -> TokenPayload:
     try:
         payload = decode_token(token)
-        data = TokenPayload(sub=payload.get("sub"), role=payload.get("role"))
+        return TokenPayload(sub=payload.get("sub"), role=payload.get("role"))
     except (JWTError, Exception):
-        raise credentials_exception
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
+def get_current_user(data: TokenPayload = Depends(get_token_payload), db: Session = Depends(get_db)) -> User:
+    cached = principal_cache.get(data.sub)
+    if cached is not None:
+        return cached
 
     user = db.query(User).filter(User.username == data.sub).first()
     if not user:
-        raise credentials_exception
-    return user
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    principal = User(id=user.id, name=user.name, username=user.username, role=user.role)
+    principal_cache.set(data.sub, principal)
+    return principal
+
+async def get_current_user_async(data: TokenPayload = Depends(get_token_payload),
+                                 db: AsyncSession = Depends(get_async_db)) -> User:
+    cached = principal_cache.get(data.sub)
+    if cached is not None:
+        return cached
 
-def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    user = (await db.execute(select(User).where(User.username == data.sub))).scalars().first()
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+    principal = User(id=user.id, name=user.name, username=user.username, role=user.role)
+    principal_cache.set(data.sub, principal)
+    return principal
+
+def require_admin(data: TokenPayload = Depends(get_token_payload), db: Session = Depends(get_db)) -> User:
+    # Reject on the token's role claim before touching the cache or database
+    if data.role != "admin":
+        raise HTTPException(status_code=403, detail="Admin privileges required")
+    current_user = get_current_user(data, db)
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin privileges required")
     return current_user
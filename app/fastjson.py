@@ -0,0 +1,30 @@
+import orjson
+from fastapi import Response
+from .models import AttendanceLog
+
+# Field order of schemas.AttendanceOut, and the matching columns to select
+ATTENDANCE_FIELDS = (
+    "attendance_id", "user_id", "clock_in", "clock_out",
+    "latitude_in", "longitude_in", "latitude_out", "longitude_out",
+    "site_id_in", "site_id_out",
+)
+
+def attendance_columns(entity=AttendanceLog) -> tuple:
+    """Columns for ATTENDANCE_FIELDS on AttendanceLog or an alias of it (see archive.attendance_source)."""
+    return tuple(getattr(entity, "id" if f == "attendance_id" else f) for f in ATTENDANCE_FIELDS)
+
+ATTENDANCE_COLUMNS = attendance_columns()
+
+def attendance_list_response(rows, next_cursor: str | None = None) -> Response:
+    """
+    Encode AttendanceLogList JSON straight from column tuples, skipping ORM
+    hydration and per-row Pydantic models. Rows may carry fewer columns than
+    ATTENDANCE_FIELDS; the remaining fields are emitted as null, exactly as
+    the model would.
+    """
+    width = len(ATTENDANCE_FIELDS)
+    items = [
+        dict(zip(ATTENDANCE_FIELDS, tuple(row) + (None,) * (width - len(row))))
+        for row in rows
+    ]
+    return Response(content=orjson.dumps({"items": items, "next_cursor": next_cursor}), media_type="application/json")
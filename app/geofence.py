@@ -0,0 +1,170 @@
+import json
+import math
+import threading
+import time
+from dataclasses import dataclass
+from sqlalchemy import case, func
+from .config import settings
+from .models import Site
+from .utils import haversine_distance_meters
+
+METERS_PER_DEGREE_LAT = 111_320.0
+MAX_CELLS_PER_FENCE = 4096  # larger fences skip the grid and are tested on every lookup
+
+@dataclass(frozen=True)
+class Fence:
+    site_id: int | None  # None for the legacy INSTITUTION_LAT/LON fallback
+    name: str
+    kind: str
+    latitude: float | None = None
+    longitude: float | None = None
+    radius_m: float | None = None
+    polygon: tuple[tuple[float, float], ...] = ()
+
+    def bbox(self) -> tuple[float, float, float, float]:
+        if self.kind == "polygon":
+            lats = [p[0] for p in self.polygon]
+            lons = [p[1] for p in self.polygon]
+            return min(lats), min(lons), max(lats), max(lons)
+        dlat = self.radius_m / METERS_PER_DEGREE_LAT
+        dlon = self.radius_m / (METERS_PER_DEGREE_LAT * max(math.cos(math.radians(self.latitude)), 1e-6))
+        return self.latitude - dlat, self.longitude - dlon, self.latitude + dlat, self.longitude + dlon
+
+    def contains(self, lat: float, lon: float) -> bool:
+        if self.kind == "polygon":
+            return point_in_polygon(lat, lon, self.polygon)
+        return haversine_distance_meters(lat, lon, self.latitude, self.longitude) <= self.radius_m
+
+def point_in_polygon(lat: float, lon: float, polygon) -> bool:
+    """
+    Even-odd ray casting on lat/lon treated as planar (fine at building scale).
+    """
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        lat_i, lon_i = polygon[i]
+        lat_j, lon_j = polygon[j]
+        if (lat_i > lat) != (lat_j > lat):
+            cross_lon = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < cross_lon:
+                inside = not inside
+        j = i
+    return inside
+
+class GeofenceIndex:
+    """
+    Uniform lat/lon grid: each fence is registered in every cell its bounding
+    box overlaps, so a lookup only tests the handful of fences near the point.
+    """
+
+    def __init__(self, fences: list[Fence], cell_deg: float):
+        self.cell_deg = cell_deg
+        self.fences = fences
+        self._cells: dict[tuple[int, int], list[Fence]] = {}
+        self._oversized: list[Fence] = []
+        for fence in fences:
+            min_lat, min_lon, max_lat, max_lon = fence.bbox()
+            span = (self._cell(max_lat) - self._cell(min_lat) + 1) * (self._cell(max_lon) - self._cell(min_lon) + 1)
+            if span > MAX_CELLS_PER_FENCE:
+                self._oversized.append(fence)
+                continue
+            for ci in range(self._cell(min_lat), self._cell(max_lat) + 1):
+                for cj in range(self._cell(min_lon), self._cell(max_lon) + 1):
+                    self._cells.setdefault((ci, cj), []).append(fence)
+
+    def _cell(self, value: float) -> int:
+        return math.floor(value / self.cell_deg)
+
+    def match(self, lat: float | None, lon: float | None) -> Fence | None:
+        if lat is None or lon is None:
+            return None
+        for fence in self._cells.get((self._cell(lat), self._cell(lon)), ()):
+            if fence.contains(lat, lon):
+                return fence
+        for fence in self._oversized:
+            if fence.contains(lat, lon):
+                return fence
+        return None
+
+def fence_from_site(site: Site) -> Fence:
+    if site.kind == "polygon":
+        points = tuple((float(lat), float(lon)) for lat, lon in json.loads(site.polygon or "[]"))
+        return Fence(site_id=site.id, name=site.name, kind="polygon", polygon=points)
+    return Fence(site_id=site.id, name=site.name, kind="circle",
+                 latitude=site.latitude, longitude=site.longitude, radius_m=site.radius_m)
+
+def _fallback_fences() -> list[Fence]:
+    return [Fence(site_id=None, name="Institution", kind="circle",
+                  latitude=settings.INSTITUTION_LAT, longitude=settings.INSTITUTION_LON,
+                  radius_m=float(settings.MAX_RADIUS_METERS))]
+
+def _sites_stamp(db) -> tuple:
+    """Changes whenever a site is added or (de)activated; sites are never edited or deleted."""
+    return tuple(db.query(
+        func.count(Site.id), func.max(Site.id), func.sum(case((Site.active == True, 1), else_=0)),
+    ).one())
+
+class Geofences:
+    """
+    Holds the live index; reload() swaps in a freshly built one atomically.
+    Every GEOFENCE_REFRESH_SECONDS a lookup compares the sites table's stamp with
+    the one the index was built from, so site changes made through another
+    worker are picked up without a restart.
+    """
+
+    def __init__(self):
+        self._index: GeofenceIndex | None = None
+        self._stamp: tuple | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def reload(self, session_factory) -> int:
+        db = session_factory()
+        try:
+            stamp = _sites_stamp(db)
+            sites = db.query(Site).filter(Site.active == True).all()
+            fences = [fence_from_site(s) for s in sites]
+        finally:
+            db.close()
+        # With no sites configured, keep honouring the single institution point
+        self._index = GeofenceIndex(fences or _fallback_fences(), settings.GEOFENCE_CELL_DEGREES)
+        self._stamp, self._checked_at = stamp, time.monotonic()
+        return len(fences)
+
+    def _refresh_if_stale(self, session_factory) -> None:
+        # One thread checks; the others keep using the current index meanwhile
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() - self._checked_at < settings.GEOFENCE_REFRESH_SECONDS:
+                return
+            db = session_factory()
+            try:
+                stamp = _sites_stamp(db)
+            finally:
+                db.close()
+            if stamp != self._stamp:
+                self.reload(session_factory)
+            else:
+                self._checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def _ensure_loaded(self, session_factory=None) -> GeofenceIndex:
+        if session_factory is None:
+            from .database import SessionLocal as session_factory
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self.reload(session_factory)
+        elif time.monotonic() - self._checked_at >= settings.GEOFENCE_REFRESH_SECONDS:
+            self._refresh_if_stale(session_factory)
+        return self._index
+
+    def match(self, lat: float | None, lon: float | None, session_factory=None) -> Fence | None:
+        return self._ensure_loaded(session_factory).match(lat, lon)
+
+    def fences(self, session_factory=None) -> list[Fence]:
+        return list(self._ensure_loaded(session_factory).fences)
+
+geofences = Geofences()
@@ -1,20 +1,117 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import OperationalError
 from starlette.middleware.sessions import SessionMiddleware
-from .views import router
-from .database import Base, engine
+from .views import router, warm_templates
+from .async_views import router as async_router
+from .routes import attendance, attendance_async, auth, auth_async, changes, reports, sites, users
+from .database import (
+    engine, async_engine, replica_engines, replica_router, SessionLocal, warm_pool, warm_async_pool,
+)
+from .schema import ensure_schema
 from .config import settings
+from .security import shutdown_hash_executor
+from .punch_ingest import punch_writer
+from .presence import presence_board
+from .geofence import geofences
+from .metrics import MetricsMiddleware, instrument_engine
+from .assets import static_assets
+from .dependencies import API_PREFIX
 
-# Create tables if they don't exist
-Base.metadata.create_all(bind=engine)
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Reported by /healthz; "ready" only between a completed startup and shutdown
+readiness: dict = {"ready": False}
+
+async def _wait_for_schema() -> int:
+    """ensure_schema(), retrying while the database is unreachable (e.g. still waking up)."""
+    deadline = time.monotonic() + settings.STARTUP_DB_TIMEOUT_SECONDS
+    delay = 0.5
+    while True:
+        try:
+            return ensure_schema(engine)
+        except OperationalError as exc:
+            if time.monotonic() + delay > deadline:
+                raise
+            logger.warning("Database not reachable yet (%s); retrying in %.1fs", exc.orig, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    schema_version = await _wait_for_schema()
+    warmed = warm_pool(engine, settings.DB_POOL_WARM_CONNECTIONS)
+    for replica in replica_engines:
+        try:
+            warm_pool(replica, settings.DB_POOL_WARM_CONNECTIONS)
+        except OperationalError as exc:
+            logger.warning("Could not warm read replica %s: %s", replica.url.render_as_string(), exc.orig)
+    if async_engine is not None:
+        await warm_async_pool(async_engine, settings.DB_POOL_WARM_CONNECTIONS)
+    compiled = warm_templates()
+    assets = static_assets.load()  # fingerprint + precompress /static
+    presence_board.load(SessionLocal)
+    geofences.reload(SessionLocal)
+    if settings.PUNCH_GROUP_COMMIT:
+        punch_writer.start()
+    readiness.update(
+        ready=True, schema_version=schema_version, pooled_connections=warmed,
+        templates=compiled, static_assets=assets, startup_seconds=round(time.perf_counter() - started, 3),
+    )
+    yield
+    readiness["ready"] = False
+    punch_writer.stop()  # drains queued punches before the process exits
+    shutdown_hash_executor()
+    if async_engine is not None:
+        await async_engine.dispose()
+    for replica in replica_engines:
+        replica.dispose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Enable sessions
 app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
 
-# Include routes
+# Request latency, per-request query counts and pool stats, served at /metrics
+if settings.METRICS_ENABLED:
+    instrument_engine("primary", engine)
+    if async_engine is not None:
+        instrument_engine("async", async_engine.sync_engine)
+    for i, replica in enumerate(replica_engines):
+        instrument_engine(f"replica{i}", replica)
+    app.add_middleware(MetricsMiddleware)
+
+# Include routes (async punch handlers shadow the sync ones when enabled)
+if settings.DB_ASYNC:
+    app.include_router(async_router)
 app.include_router(router)
 
-# Serve static files (CSS, JS, images)
-app.mount("/static", StaticFiles(directory="app/web/static"), name="static")
+# JSON API under /api (the web forms already own /attendance/clock-in and /clock-out)
+if settings.DB_ASYNC:
+    app.include_router(auth_async.router, prefix=f"{API_PREFIX}/users")
+    app.include_router(attendance_async.router, prefix=f"{API_PREFIX}/attendance")
+app.include_router(auth.router, prefix=f"{API_PREFIX}/users")
+app.include_router(users.router, prefix=f"{API_PREFIX}/users")
+app.include_router(attendance.router, prefix=f"{API_PREFIX}/attendance")
+app.include_router(reports.router, prefix=f"{API_PREFIX}/reports")
+app.include_router(sites.router, prefix=f"{API_PREFIX}/sites")
+app.include_router(changes.router, prefix=f"{API_PREFIX}/changes")
+
+@app.get("/healthz", include_in_schema=False)
+def healthz():
+    if not readiness["ready"]:
+        return JSONResponse({"status": "starting"}, status_code=503)
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql("SELECT 1")
+    except OperationalError:
+        return JSONResponse({"status": "database unavailable", **readiness}, status_code=503)
+    return {"status": "ok", **readiness, "replicas": replica_router.status()}
+
+# Serve static files (CSS, JS, images) from memory with content-hashed URLs
+app.mount("/static", static_assets, name="static")
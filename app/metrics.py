@@ -0,0 +1,262 @@
+import bisect
+import contextvars
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from sqlalchemy import event
+from .config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """
+    Thread-safe cumulative histogram (Prometheus-style buckets, in seconds).
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self._counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative, running = [], 0
+            for upper, n in zip(self.buckets + (float("inf"),), self._counts):
+                running += n
+                cumulative.append((upper, running))
+            return {"buckets": cumulative, "sum": self._sum, "count": self._count}
+
+# ---------------- REQUEST / DATABASE INSTRUMENTATION ----------------
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+DB_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+MAX_FINGERPRINTS = 500
+
+class LabeledHistogram:
+    """A Histogram per label tuple, created on first observation."""
+
+    def __init__(self, labels: tuple[str, ...], buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.labels = labels
+        self.buckets = buckets
+        self._series: dict[tuple, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(label_values, Histogram(self.buckets))
+        series.observe(value)
+
+    def items(self) -> list[tuple[tuple, dict]]:
+        with self._lock:
+            series = list(self._series.items())
+        return [(labels, h.snapshot()) for labels, h in sorted(series)]
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# Set by MetricsMiddleware for the duration of a request. Threadpool endpoints and
+# streaming iterators run in a copy of the context, so they update the same object.
+_request_stats: contextvars.ContextVar[RequestStats | None] = contextvars.ContextVar("request_stats", default=None)
+_current_path: contextvars.ContextVar[str] = contextvars.ContextVar("current_path", default="")
+
+request_latency = LabeledHistogram(("method", "route", "status"))
+request_queries = LabeledHistogram(("method", "route"), QUERY_COUNT_BUCKETS)
+request_db_time = LabeledHistogram(("method", "route"), DB_TIME_BUCKETS)
+query_time = Histogram(DB_TIME_BUCKETS)  # every statement, including background work
+
+_slow_lock = threading.Lock()
+slow_queries: deque = deque(maxlen=settings.SLOW_QUERY_LOG_SIZE)
+slow_by_fingerprint: dict[str, dict] = {}
+_engines: dict[str, object] = {}
+
+_PARAM = re.compile(r"%\(\w+\)s|\$\d+|:\w+|\?")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_ROWS = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_SPACE = re.compile(r"\s+")
+
+def fingerprint(statement: str) -> tuple[str, str]:
+    """
+    Normalise a statement so executions that differ only in parameters, IN-list
+    length or multi-row VALUES share one (id, text) fingerprint.
+    """
+    text = _SPACE.sub(" ", statement).strip()
+    text = _PARAM.sub("?", _LITERAL.sub("?", text))
+    text = _ROWS.sub(r"\1, ...", _LIST.sub("(...)", text))
+    return hashlib.sha1(text.encode()).hexdigest()[:12], text
+
+def _record_slow(statement: str, elapsed: float) -> None:
+    fp, text = fingerprint(statement)
+    path = _current_path.get() or None
+    with _slow_lock:
+        slow_queries.append({
+            "at": datetime.utcnow().isoformat(timespec="milliseconds"),
+            "fingerprint": fp, "statement": text, "seconds": round(elapsed, 6), "path": path,
+        })
+        entry = slow_by_fingerprint.get(fp)
+        if entry is None and len(slow_by_fingerprint) < MAX_FINGERPRINTS:
+            entry = slow_by_fingerprint[fp] = {"statement": text, "count": 0, "seconds": 0.0, "max_seconds": 0.0}
+        if entry is not None:
+            entry["count"] += 1
+            entry["seconds"] += elapsed
+            entry["max_seconds"] = max(entry["max_seconds"], elapsed)
+    logger.warning("Slow query %s (%.1f ms, %s): %s", fp, elapsed * 1000, path or "no request", text)
+
+def slow_query_report() -> dict:
+    with _slow_lock:
+        return {
+            "threshold_ms": settings.SLOW_QUERY_MS,
+            "recent": list(slow_queries),
+            "by_fingerprint": {fp: dict(e) for fp, e in slow_by_fingerprint.items()},
+        }
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    query_time.observe(elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        _record_slow(statement, elapsed)
+
+def instrument_engine(name: str, engine) -> None:
+    """Attach query timing to a sync Engine (pass async_engine.sync_engine for async ones)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    _engines[name] = engine
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: per-route latency (until the last body chunk is sent,
+    so streamed exports are timed in full) plus per-request query count and DB time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        stats_token = _request_stats.set(stats)
+        path_token = _current_path.set(scope["path"])
+        status = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_stats.reset(stats_token)
+            _current_path.reset(path_token)
+            route = _route_label(scope)
+            method = scope["method"]
+            request_latency.observe((method, route, str(status)), elapsed)
+            request_queries.observe((method, route), stats.queries)
+            request_db_time.observe((method, route), stats.db_seconds)
+
+def _route_label(scope) -> str:
+    # Templates ("/db-admin/users/{user_id}/edit"), never raw paths, to keep label cardinality bounded
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    if scope.get("root_path"):
+        return scope["root_path"]  # mounted app, e.g. /static
+    return "<unmatched>"
+
+def pool_stats() -> dict[str, dict]:
+    stats = {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        stats[name] = {
+            key: getattr(pool, key)()
+            for key in ("size", "checkedin", "checkedout", "overflow")
+            if callable(getattr(pool, key, None))
+        }
+    return stats
+
+# ---------------- PROMETHEUS TEXT FORMAT ----------------
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _histogram_lines(name: str, help_text: str, names: tuple[str, ...], series) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for values, snap in series:
+        for upper, count in snap["buckets"]:
+            le = "+Inf" if upper == float("inf") else repr(float(upper))
+            lines.append(f"{name}_bucket{_labels(names + ('le',), values + (le,))} {count}")
+        lines.append(f"{name}_sum{_labels(names, values)} {snap['sum']}")
+        lines.append(f"{name}_count{_labels(names, values)} {snap['count']}")
+    return lines
+
+def _gauge_lines(name: str, kind: str, help_text: str, names: tuple[str, ...], samples) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_labels(names, values)} {value}" for values, value in samples]
+    return lines
+
+def render_prometheus(hash_stats: dict) -> str:
+    lines: list[str] = []
+    lines += _histogram_lines("http_request_duration_seconds", "Request latency by route template.",
+                              request_latency.labels, request_latency.items())
+    lines += _histogram_lines("http_request_db_queries", "SQL statements executed per request.",
+                              request_queries.labels, request_queries.items())
+    lines += _histogram_lines("http_request_db_seconds", "Time spent in SQL per request.",
+                              request_db_time.labels, request_db_time.items())
+    lines += _histogram_lines("db_query_duration_seconds", "Duration of every SQL statement.",
+                              (), [((), query_time.snapshot())])
+    with _slow_lock:
+        slow = [((fp,), e["count"]) for fp, e in sorted(slow_by_fingerprint.items())]
+    lines += _gauge_lines("db_slow_queries_total", "counter",
+                          f"Statements slower than {settings.SLOW_QUERY_MS:g} ms, by fingerprint.", ("fingerprint",), slow)
+
+    pools = pool_stats()
+    for key, help_text in (
+        ("size", "Configured pool size."),
+        ("checkedout", "Connections currently checked out."),
+        ("checkedin", "Idle connections in the pool."),
+        ("overflow", "Connections opened beyond the pool size (negative while the pool is filling)."),
+    ):
+        samples = [((name,), stats[key]) for name, stats in pools.items() if key in stats]
+        lines += _gauge_lines(f"db_pool_{key}", "gauge", help_text, ("engine",), samples)
+
+    lines += _gauge_lines("hash_executor_workers", "gauge", "Password hashing workers.", (), [((), hash_stats["workers"])])
+    lines += _gauge_lines("hash_executor_in_flight", "gauge", "Hashes running or queued.", (), [((), hash_stats["in_flight"])])
+    lines += _gauge_lines("hash_executor_queue_depth", "gauge", "Hashes waiting for a worker.", (), [((), hash_stats["queue_depth"])])
+    lines += _gauge_lines("hash_executor_rejected_total", "counter", "Hashes refused with 503.", (), [((), hash_stats["rejected"])])
+    lines += _histogram_lines("hash_duration_seconds", "Password hash/verify latency including queueing.",
+                              (), [((), hash_stats["latency"])])
+    return "\n".join(lines) + "\n"
@@ -1,24 +1,79 @@
-from sqlalchemy import Integer, String, DateTime, ForeignKey, UniqueConstraint, Float
+from sqlalchemy import Integer, BigInteger, String, Text, Boolean, DateTime, Date, ForeignKey, UniqueConstraint, Float, Index, text
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from datetime import datetime
+from sqlalchemy.sql.functions import FunctionElement
+from datetime import date, datetime
 from .database import Base
 
+# ---------------- CHANGE SEQUENCE ----------------
+# users and attendance_logs share one change sequence: every insert or update
+# stamps the row with next_change_seq(), which app.changes pages through.
+class next_change_seq(FunctionElement):
+    type = BigInteger()
+    inherit_cache = True
+
+@compiles(next_change_seq)
+def _next_change_seq(element, compiler, **kw):
+    # Writers are serialized on SQLite, so max + 1 is increasing in commit order
+    # (rows written by one statement may share a value)
+    return (
+        "(SELECT COALESCE(MAX(seq), 0) + 1 FROM ("
+        "SELECT MAX(change_seq) AS seq FROM attendance_logs UNION ALL SELECT MAX(change_seq) FROM users))"
+    )
+
+@compiles(next_change_seq, "postgresql")
+def _next_change_seq_postgresql(element, compiler, **kw):
+    # The writing transaction's id: the feed reads only ids below the oldest
+    # transaction still in flight, which can no longer gain rows
+    return "txid_current()"
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Name/username search (app.user_search): substring via trigrams on PostgreSQL (needs pg_trgm),
+        # case-insensitive prefix on SQLite
+        Index("ix_users_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"})
+        .ddl_if(dialect="postgresql"),
+        Index("ix_users_username_trgm", "username", postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"})
+        .ddl_if(dialect="postgresql"),
+        Index("ix_users_name_nocase", text("name COLLATE NOCASE")).ddl_if(dialect="sqlite"),
+        Index("ix_users_username_nocase", text("username COLLATE NOCASE")).ddl_if(dialect="sqlite"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     name: Mapped[str] = mapped_column(String, nullable=False)
     username: Mapped[str] = mapped_column(String, unique=True, index=True, nullable=False)
     password: Mapped[str] = mapped_column(String, nullable=False)
     role: Mapped[str] = mapped_column(String, nullable=False)  # "admin", "staff", "db_admin"
+    change_seq: Mapped[int | None] = mapped_column(BigInteger, index=True, default=next_change_seq(), onupdate=next_change_seq())
+    changed_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     attendances: Mapped[list["AttendanceLog"]] = relationship(
         "AttendanceLog", back_populates="user", cascade="all, delete-orphan"
     )
+    daily_rollups: Mapped[list["AttendanceDaily"]] = relationship(
+        "AttendanceDaily", cascade="all, delete-orphan"
+    )
+    archived_attendances: Mapped[list["AttendanceArchive"]] = relationship(
+        "AttendanceArchive", cascade="all, delete-orphan"
+    )
 
 class AttendanceLog(Base):
     __tablename__ = "attendance_logs"
-    __table_args__ = (UniqueConstraint("user_id", "clock_in", name="uq_user_clockin_timestamp"),)
+    __table_args__ = (
+        UniqueConstraint("user_id", "clock_in", name="uq_user_clockin_timestamp"),
+        # At most one open session per user per (UTC) clock-in day, so a double or racing
+        # clock-in is refused while a session left open on an earlier day is not; also the
+        # lookup index for clock-out
+        Index(
+            "uq_attendance_open_day_pg", "user_id", text("(clock_in::date)"), unique=True,
+            postgresql_where=text("clock_out IS NULL"),
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "uq_attendance_open_day_sqlite", "user_id", text("date(clock_in)"), unique=True,
+            sqlite_where=text("clock_out IS NULL"),
+        ).ddl_if(dialect="sqlite"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
@@ -30,4 +85,77 @@ class AttendanceLog(Base):
     latitude_out: Mapped[float | None] = mapped_column(Float, nullable=True)
     longitude_out: Mapped[float | None] = mapped_column(Float, nullable=True)
 
+    # Geofence site matched at punch time (None if no site matched or none configured)
+    site_id_in: Mapped[int | None] = mapped_column(Integer, ForeignKey("sites.id"), nullable=True)
+    site_id_out: Mapped[int | None] = mapped_column(Integer, ForeignKey("sites.id"), nullable=True)
+
+    # Stamped on insert and on clock-out (see next_change_seq)
+    change_seq: Mapped[int | None] = mapped_column(BigInteger, index=True, default=next_change_seq(), onupdate=next_change_seq())
+    changed_at: Mapped[datetime | None] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
     user: Mapped["User"] = relationship("User", back_populates="attendances")
+
+class Site(Base):
+    """A campus or building geofence: a circle (center + radius) or a polygon."""
+    __tablename__ = "sites"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    name: Mapped[str] = mapped_column(String, nullable=False, unique=True)
+    kind: Mapped[str] = mapped_column(String, nullable=False)  # "circle", "polygon"
+    latitude: Mapped[float | None] = mapped_column(Float, nullable=True)
+    longitude: Mapped[float | None] = mapped_column(Float, nullable=True)
+    radius_m: Mapped[float | None] = mapped_column(Float, nullable=True)
+    polygon: Mapped[str | None] = mapped_column(Text, nullable=True)  # JSON [[lat, lon], ...]
+    active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+
+class AttendanceDaily(Base):
+    """Per-user, per-day rollup of attendance_logs (day = UTC date of clock_in)."""
+    __tablename__ = "attendance_daily"
+
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True, index=True)
+    first_in: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_out: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    worked_seconds: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    punch_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    open_sessions: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+class AttendanceArchive(Base):
+    """
+    Closed punches moved out of attendance_logs by app.archive. Rows keep their
+    original id, so (clock_in, id) stays unique across both tables.
+    """
+    __tablename__ = "attendance_archive"
+    __table_args__ = (Index("ix_attendance_archive_user_clock_in", "user_id", "clock_in"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    clock_in: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    clock_out: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    latitude_in: Mapped[float | None] = mapped_column(Float, nullable=True)
+    longitude_in: Mapped[float | None] = mapped_column(Float, nullable=True)
+    latitude_out: Mapped[float | None] = mapped_column(Float, nullable=True)
+    longitude_out: Mapped[float | None] = mapped_column(Float, nullable=True)
+    site_id_in: Mapped[int | None] = mapped_column(Integer, ForeignKey("sites.id"), nullable=True)
+    site_id_out: Mapped[int | None] = mapped_column(Integer, ForeignKey("sites.id"), nullable=True)
+
+class ArchiveSegment(Base):
+    """One archived calendar month: the bounds readers check before touching attendance_archive."""
+    __tablename__ = "archive_segments"
+
+    month: Mapped[date] = mapped_column(Date, primary_key=True)  # first day of the month
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_clock_in: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_clock_in: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    min_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    max_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+class SchemaVersion(Base):
+    """Single row: the app.schema.SCHEMA_VERSION the tables were last brought up to."""
+    __tablename__ = "schema_version"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,120 @@
+import asyncio
+import json
+import threading
+from datetime import date, datetime
+from sqlalchemy import func
+from .models import AttendanceLog, User
+
+ABSENT, WORKING, PRESENT = "absent", "working", "present"
+
+class PresenceBoard:
+    """
+    In-memory view of who is in today, per process. Loaded once with two small
+    queries, then kept current by the punch handlers, so the admin dashboard
+    never scans attendance history. Open SSE streams are notified of changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._status: dict[int, str] = {}  # users not listed are absent
+        self._total_users = 0
+        self._day: date | None = None
+        self._loaded = False
+        self._subscribers: set[tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = set()
+
+    def load(self, session_factory) -> None:
+        today = datetime.utcnow().date()
+        start_dt = datetime.combine(today, datetime.min.time())
+        db = session_factory()
+        try:
+            total_users = db.query(func.count(User.id)).scalar() or 0
+            # Latest punch per user today decides their status
+            rows = (
+                db.query(AttendanceLog.user_id, AttendanceLog.clock_in, AttendanceLog.clock_out)
+                .filter(AttendanceLog.clock_in >= start_dt)
+                .order_by(AttendanceLog.user_id, AttendanceLog.clock_in.asc())
+                .all()
+            )
+        finally:
+            db.close()
+        status = {user_id: (PRESENT if clock_out else WORKING) for user_id, _, clock_out in rows}
+        with self._lock:
+            self._status = status
+            self._total_users = total_users
+            self._day = today
+            self._loaded = True
+
+    def ensure_loaded(self, session_factory) -> None:
+        if not self._loaded:
+            self.load(session_factory)
+
+    def _roll_day(self) -> None:
+        today = datetime.utcnow().date()
+        if self._day != today:
+            self._status.clear()
+            self._day = today
+
+    def summary(self) -> dict:
+        with self._lock:
+            self._roll_day()
+            return self._summary()
+
+    def _summary(self) -> dict:
+        working = sum(1 for s in self._status.values() if s == WORKING)
+        present = len(self._status)
+        return {
+            "present": present,
+            "working": working,
+            "late": 0,
+            "absent": max(self._total_users - present, 0),
+        }
+
+    def user_added(self, count: int = 1) -> None:
+        with self._lock:
+            self._total_users += count
+            event = {"user_id": None, "status": None, "summary": self._summary()}
+        self._publish(event)
+
+    def clocked_in(self, user_id: int) -> None:
+        self._set(user_id, WORKING)
+
+    def clocked_out(self, user_id: int) -> None:
+        self._set(user_id, PRESENT)
+
+    def _set(self, user_id: int, status: str) -> None:
+        with self._lock:
+            self._roll_day()
+            if self._status.get(user_id) == status:
+                return
+            self._status[user_id] = status
+            event = {"user_id": user_id, "status": status, "summary": self._summary()}
+        self._publish(event)
+
+    # ---------------- SSE fan-out ----------------
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        with self._lock:
+            self._subscribers = {(loop, q) for loop, q in self._subscribers if q is not queue}
+
+    def _publish(self, event: dict) -> None:
+        payload = json.dumps(event)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            # Punch handlers run in worker threads; hop onto the stream's loop
+            try:
+                loop.call_soon_threadsafe(_offer, queue, payload)
+            except RuntimeError:  # loop already closed
+                self.unsubscribe(queue)
+
+def _offer(queue: asyncio.Queue, payload: str) -> None:
+    if queue.full():
+        queue.get_nowait()  # slow client: drop its oldest event rather than grow without bound
+    queue.put_nowait(payload)
+
+presence_board = PresenceBoard()
@@ -0,0 +1,125 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from .config import settings
+from .database import SessionLocal
+from .models import AttendanceLog
+from .rollups import clock_in_rollup, clock_in_params, clock_in_batch_params
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class GroupCommitWriter:
+    """
+    Write-behind batcher for clock-in rows. Callers get a Future that resolves
+    to the new row id only after the batch containing it has been committed,
+    so a response never acknowledges a punch that is not durable.
+    """
+
+    def __init__(self, max_rows: int, window_ms: float):
+        self.max_rows = max_rows
+        self.window = window_ms / 1000.0
+        self._queue: queue.Queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+    def start(self) -> None:
+        with self._lock:
+            self._stopped = False
+            self._start_locked()
+
+    def _start_locked(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="punch-group-commit", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Flush everything already queued, then stop the writer thread."""
+        with self._lock:
+            self._stopped = True
+            thread, self._thread = self._thread, None
+        if thread is not None and thread.is_alive():
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, values: dict) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if not self._stopped:
+                self._start_locked()
+                self._queue.put((values, future))
+                return future
+        # Stopped (shutdown in progress): write it directly rather than restart the thread
+        self._flush([(values, future)])
+        return future
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # Drain anything that raced in behind the stop marker
+        leftovers = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftovers.append(item)
+        if leftovers:
+            self._flush(leftovers)
+
+    def _flush(self, batch: list) -> None:
+        stmt = insert(AttendanceLog).returning(AttendanceLog.id, sort_by_parameter_order=True)
+        db = SessionLocal()
+        rollup = clock_in_rollup(db.get_bind().dialect.name)
+        try:
+            try:
+                ids = db.execute(stmt, [values for values, _ in batch]).scalars().all()
+                db.execute(rollup, clock_in_batch_params([(v["user_id"], v["clock_in"]) for v, _ in batch]))
+                db.commit()
+                for (_, future), row_id in zip(batch, ids):
+                    future.set_result(row_id)
+                return
+            except IntegrityError:
+                db.rollback()
+            # One bad row must not fail its neighbours: retry individually
+            for values, future in batch:
+                try:
+                    row_id = db.execute(stmt, [values]).scalar_one()
+                    db.execute(rollup, clock_in_params(values["user_id"], values["clock_in"]))
+                    db.commit()
+                    future.set_result(row_id)
+                except Exception as exc:
+                    db.rollback()
+                    future.set_exception(exc)
+        except Exception as exc:
+            logger.exception("Group commit of %d punches failed", len(batch))
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+        finally:
+            db.close()
+
+punch_writer = GroupCommitWriter(settings.PUNCH_BATCH_MAX_ROWS, settings.PUNCH_BATCH_WINDOW_MS)
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+from .archive import archived_ids
+from .config import settings
+from .database import dialect_insert
+from .geofence import geofences
+from .models import AttendanceLog, User
+from .rollups import clock_in_rollup, clock_in_batch_params, record_clock_out
+from .schemas import SyncPunch, SyncItemResult
+
+CLOCK_SKEW = timedelta(minutes=5)
+
+def utc_naive(ts: datetime) -> datetime:
+    # attendance_logs stores naive UTC, like datetime.utcnow()
+    if ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def _insert_ins(db: Session, ins: list[tuple[int, dict]], results: dict[int, SyncItemResult]) -> dict:
+    """
+    Insert clock-in rows with one multi-row INSERT ... ON CONFLICT DO NOTHING and
+    record each one's result. Returns {(user_id, clock_in): id} of the rows created.
+    """
+    # The hot table's unique index cannot see archived months; replays of those are duplicates too
+    archived = archived_ids(db, [(v["user_id"], v["clock_in"]) for _, v in ins])
+    for i, v in ins:
+        if (v["user_id"], v["clock_in"]) in archived:
+            results[i] = SyncItemResult(index=i, status="duplicate", attendance_id=archived[(v["user_id"], v["clock_in"])])
+    ins = [(i, v) for i, v in ins if (v["user_id"], v["clock_in"]) not in archived]
+    if not ins:
+        return {}
+    dialect = db.get_bind().dialect.name
+    stmt = (
+        dialect_insert(dialect)(AttendanceLog)
+        .on_conflict_do_nothing()  # uq_user_clockin_timestamp or the one-open-session-per-day index
+        .returning(AttendanceLog.id, AttendanceLog.user_id, AttendanceLog.clock_in)
+    )
+    created = {(uid, ci): row_id for row_id, uid, ci in db.execute(stmt, [v for _, v in ins])}
+    if created:
+        db.execute(clock_in_rollup(dialect), clock_in_batch_params(list(created)))
+    existing_keys = [(v["user_id"], v["clock_in"]) for _, v in ins if (v["user_id"], v["clock_in"]) not in created]
+    existing = {}
+    if existing_keys:
+        existing = {
+            (uid, ci): row_id
+            for row_id, uid, ci in db.query(AttendanceLog.id, AttendanceLog.user_id, AttendanceLog.clock_in)
+            .filter(tuple_(AttendanceLog.user_id, AttendanceLog.clock_in).in_(existing_keys))
+        }
+    for i, v in ins:
+        key = (v["user_id"], v["clock_in"])
+        if key in created:
+            results[i] = SyncItemResult(index=i, status="created", attendance_id=created[key])
+        elif key in existing:
+            results[i] = SyncItemResult(index=i, status="duplicate", attendance_id=existing[key])
+        else:
+            # Only the open-session index can have refused it
+            results[i] = SyncItemResult(index=i, status="rejected", detail="Already clocked in")
+    return created
+
+def sync_punches(db: Session, punches: list[SyncPunch], current_user: User) -> list[SyncItemResult]:
+    """
+    Apply a device's offline backlog in one transaction. Clock-ins are
+    inserted with ON CONFLICT DO NOTHING, so a replayed batch reports
+    "duplicate" instead of creating rows twice. An in followed by its out in
+    the same batch is inserted already closed, since a user can only have one
+    open session per day; other clock-outs close the latest open session at or before
+    their time, and the remaining open clock-ins are inserted last.
+    """
+    results: dict[int, SyncItemResult] = {}
+    now = datetime.utcnow()
+
+    known_users = {uid for (uid,) in db.query(User.id).filter(User.id.in_({p.user_id for p in punches}))}
+    accepted = []  # (index, punch, timestamp, site_id)
+    for i, p in enumerate(punches):
+        ts = utc_naive(p.timestamp)
+        if current_user.role != "admin" and current_user.id != p.user_id:
+            results[i] = SyncItemResult(index=i, status="rejected", detail="Not permitted")
+        elif p.user_id not in known_users:
+            results[i] = SyncItemResult(index=i, status="rejected", detail="User not found")
+        elif ts > now + CLOCK_SKEW:
+            results[i] = SyncItemResult(index=i, status="rejected", detail="Timestamp is in the future")
+        else:
+            site = geofences.match(p.latitude, p.longitude)
+            if site is None:
+                results[i] = SyncItemResult(index=i, status="rejected",
+                                            detail=f"Outside allowed location radius for clock-{p.kind}")
+            else:
+                accepted.append((i, p, ts, site.site_id))
+
+    # ---- pair each clock-in with the next clock-out of the same user in the batch ----
+    ins, seen = [], set()
+    pending: dict[int, tuple[int, dict]] = {}  # user_id -> latest unpaired in
+    paired: dict[int, int] = {}  # index of out -> index of its in
+    for i, p, ts, site_id in sorted(accepted, key=lambda a: (a[2], a[1].kind != "in")):
+        if p.kind == "in":
+            if (p.user_id, ts) in seen:
+                results[i] = SyncItemResult(index=i, status="duplicate")
+                continue
+            seen.add((p.user_id, ts))
+            # Keys stay identical across rows so they go out as one executemany
+            entry = (i, {"user_id": p.user_id, "clock_in": ts, "latitude_in": p.latitude,
+                         "longitude_in": p.longitude, "site_id_in": site_id, "clock_out": None,
+                         "latitude_out": None, "longitude_out": None, "site_id_out": None})
+            ins.append(entry)
+            pending[p.user_id] = entry
+            continue
+        entry = pending.get(p.user_id)
+        if entry is None or (p.clock_in is not None and utc_naive(p.clock_in) != entry[1]["clock_in"]):
+            continue
+        entry[1].update(clock_out=ts, latitude_out=p.latitude, longitude_out=p.longitude, site_id_out=site_id)
+        paired[i] = entry[0]
+        del pending[p.user_id]
+
+    # ---- closed sessions first: they cannot clash with an open one ----
+    closed_ins = [(i, v) for i, v in ins if v["clock_out"] is not None]
+    _insert_ins(db, closed_ins, results)
+    for i, p, ts, site_id in accepted:
+        if i in paired and results[paired[i]].status == "created":
+            record_clock_out(db, p.user_id, utc_naive(punches[paired[i]].timestamp), ts)
+            results[i] = SyncItemResult(index=i, status="closed", attendance_id=results[paired[i]].attendance_id)
+
+    # ---- clock-outs: resolve against sessions prefetched in one query ----
+    # (unpaired outs, and outs whose in was a duplicate: a replay finds its closed row)
+    outs = sorted((a for a in accepted if a[1].kind == "out" and a[0] not in results), key=lambda a: a[2])
+    if outs:
+        earliest = outs[0][2] - timedelta(hours=settings.SYNC_LOOKBACK_HOURS)
+        sessions: dict[int, list[AttendanceLog]] = {}
+        for log in (
+            db.query(AttendanceLog)
+            .filter(AttendanceLog.user_id.in_({p.user_id for _, p, _, _ in outs}),
+                    AttendanceLog.clock_in >= earliest,
+                    AttendanceLog.clock_in <= outs[-1][2])
+            .order_by(AttendanceLog.clock_in.asc())
+        ):
+            sessions.setdefault(log.user_id, []).append(log)
+
+        for i, p, ts, site_id in outs:
+            candidates = sessions.get(p.user_id, [])
+            if p.clock_in is not None:
+                wanted = utc_naive(p.clock_in)
+                target = next((s for s in candidates if s.clock_in == wanted), None)
+            else:
+                target = next((s for s in reversed(candidates) if s.clock_in <= ts and s.clock_out is None), None)
+                if target is None:
+                    target = next((s for s in candidates if s.clock_out == ts), None)
+            if target is None:
+                results[i] = SyncItemResult(index=i, status="rejected", detail="No active clock-in found")
+            elif target.clock_out == ts:
+                results[i] = SyncItemResult(index=i, status="duplicate", attendance_id=target.id)
+            elif target.clock_out is not None:
+                results[i] = SyncItemResult(index=i, status="rejected", attendance_id=target.id,
+                                            detail="Session already clocked out")
+            elif ts < target.clock_in:
+                results[i] = SyncItemResult(index=i, status="rejected", attendance_id=target.id,
+                                            detail="Clock-out precedes clock-in")
+            else:
+                target.clock_out = ts
+                target.latitude_out = p.latitude
+                target.longitude_out = p.longitude
+                target.site_id_out = site_id
+                record_clock_out(db, target.user_id, target.clock_in, ts)
+                results[i] = SyncItemResult(index=i, status="closed", attendance_id=target.id)
+
+    # ---- open sessions last, once earlier sessions have been closed ----
+    db.flush()
+    _insert_ins(db, [(i, v) for i, v in ins if v["clock_out"] is None], results)
+
+    db.commit()
+    return [results[i] for i in range(len(punches))]
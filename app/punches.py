@@ -0,0 +1,53 @@
+"""
+Single-statement punch writes shared by the sync and async handlers.
+
+clock_in_stmt inserts a session only if the user exists and has none open
+from the same day (INSERT ... SELECT ... WHERE NOT EXISTS ... RETURNING);
+clock_out_stmt closes the user's latest open session (UPDATE ... RETURNING).
+Both return the row in AttendanceOut field order, so no refresh is needed.
+The partial unique index on (user_id, clock-in day) of open sessions serves
+the open-session lookup and rejects a second same-day session from punches
+racing each other. A session left open on an earlier day does not block a
+new clock-in.
+"""
+from datetime import datetime, time, timedelta
+from sqlalchemy import DateTime, Float, Integer, insert, literal, select, update
+from .fastjson import ATTENDANCE_COLUMNS, ATTENDANCE_FIELDS
+from .models import AttendanceLog, User
+from .schemas import AttendanceOut
+
+ALREADY_CLOCKED_IN = "You are already clocked in today"
+
+def _open_session(user_id: int):
+    return select(AttendanceLog.id).where(AttendanceLog.user_id == user_id, AttendanceLog.clock_out == None)
+
+def clock_in_stmt(user_id: int, clock_in: datetime, latitude: float | None, longitude: float | None,
+                  site_id: int | None):
+    """Returns no row when the user does not exist or already has a session open from the same day."""
+    day_start = datetime.combine(clock_in.date(), time.min)
+    same_day_open = _open_session(user_id).where(
+        AttendanceLog.clock_in >= day_start, AttendanceLog.clock_in < day_start + timedelta(days=1)
+    )
+    source = select(
+        User.id, literal(clock_in, DateTime), literal(latitude, Float), literal(longitude, Float),
+        literal(site_id, Integer),
+    ).where(User.id == user_id, ~same_day_open.exists())
+    return (
+        insert(AttendanceLog)
+        .from_select(["user_id", "clock_in", "latitude_in", "longitude_in", "site_id_in"], source)
+        .returning(*ATTENDANCE_COLUMNS)
+    )
+
+def clock_out_stmt(user_id: int, clock_out: datetime, latitude: float | None, longitude: float | None,
+                   site_id: int | None):
+    """Closes the user's latest open session; returns no row when there is none."""
+    latest_open = _open_session(user_id).order_by(AttendanceLog.clock_in.desc()).limit(1).scalar_subquery()
+    return (
+        update(AttendanceLog)
+        .where(AttendanceLog.id == latest_open, AttendanceLog.clock_out == None)
+        .values(clock_out=clock_out, latitude_out=latitude, longitude_out=longitude, site_id_out=site_id)
+        .returning(*ATTENDANCE_COLUMNS)
+    )
+
+def attendance_out(row) -> AttendanceOut:
+    return AttendanceOut(**dict(zip(ATTENDANCE_FIELDS, row)))
@@ -0,0 +1,174 @@
+"""
+Maintenance of the attendance_daily rollup table.
+
+Punch handlers add the statements from clock_in_rollup/clock_out_rollup to the
+same transaction as the punch itself, so the rollup is always consistent with
+attendance_logs. `python -m app.rollups` rebuilds it from raw rows.
+"""
+import argparse
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, delete, insert, update
+from sqlalchemy.orm import Session
+from .archive import attendance_source
+from .database import dialect_insert
+from .models import AttendanceDaily
+from .stats import attendance_stats
+
+BACKFILL_CHUNK = 1000
+
+def clock_in_rollup(dialect_name: str):
+    """
+    Upsert for clock-ins; execute with clock_in_params(...) or clock_in_batch_params(...).
+    """
+    t = AttendanceDaily.__table__
+    stmt = dialect_insert(dialect_name)(t)
+    return stmt.on_conflict_do_update(
+        index_elements=[t.c.user_id, t.c.day],
+        set_={
+            "first_in": case((stmt.excluded.first_in < t.c.first_in, stmt.excluded.first_in), else_=t.c.first_in),
+            "punch_count": t.c.punch_count + stmt.excluded.punch_count,
+            "open_sessions": t.c.open_sessions + stmt.excluded.open_sessions,
+        },
+    )
+
+def clock_in_params(user_id: int, clock_in: datetime) -> dict:
+    return {
+        "user_id": user_id, "day": clock_in.date(), "first_in": clock_in, "last_out": None,
+        "worked_seconds": 0, "punch_count": 1, "open_sessions": 1,
+    }
+
+def clock_in_batch_params(punches: list[tuple[int, datetime]]) -> list[dict]:
+    """
+    Merge (user_id, clock_in) pairs per (user, day) so one multi-row upsert
+    never touches the same rollup row twice (PostgreSQL rejects that).
+    """
+    merged: dict[tuple[int, date], dict] = {}
+    for user_id, clock_in in punches:
+        params = clock_in_params(user_id, clock_in)
+        existing = merged.get((user_id, params["day"]))
+        if existing is None:
+            merged[(user_id, params["day"])] = params
+        else:
+            existing["punch_count"] += 1
+            existing["open_sessions"] += 1
+            existing["first_in"] = min(existing["first_in"], clock_in)
+    return list(merged.values())
+
+def clock_out_rollup(user_id: int, clock_in: datetime, clock_out: datetime):
+    t = AttendanceDaily.__table__
+    return (
+        update(t)
+        .where(t.c.user_id == user_id, t.c.day == clock_in.date())
+        .values(
+            worked_seconds=t.c.worked_seconds + int((clock_out - clock_in).total_seconds()),
+            open_sessions=case((t.c.open_sessions > 0, t.c.open_sessions - 1), else_=0),
+            last_out=case(
+                (t.c.last_out == None, clock_out),
+                (t.c.last_out < clock_out, clock_out),
+                else_=t.c.last_out,
+            ),
+        )
+    )
+
+def record_clock_in(db: Session, user_id: int, clock_in: datetime) -> None:
+    db.execute(clock_in_rollup(db.get_bind().dialect.name), clock_in_params(user_id, clock_in))
+
+def record_clock_out(db: Session, user_id: int, clock_in: datetime, clock_out: datetime) -> None:
+    result = db.execute(clock_out_rollup(user_id, clock_in, clock_out))
+    if result.rowcount == 0:
+        # Session predates the rollup table; rebuild that user's day from raw rows.
+        # Flush first: the caller's clock_out change is still pending (autoflush is off).
+        db.flush()
+        rebuild_user_day(db, user_id, clock_in.date())
+
+def _fold(acc: dict, user_id: int, clock_in: datetime, clock_out: datetime | None) -> None:
+    """Add one punch to a {(user_id, day): rollup dict} accumulator."""
+    key = (user_id, clock_in.date())
+    r = acc.get(key)
+    if r is None:
+        r = acc[key] = {
+            "user_id": user_id, "day": key[1], "first_in": clock_in, "last_out": None,
+            "worked_seconds": 0, "punch_count": 0, "open_sessions": 0,
+        }
+    r["punch_count"] += 1
+    if clock_in < r["first_in"]:
+        r["first_in"] = clock_in
+    if clock_out is None:
+        r["open_sessions"] += 1
+    else:
+        r["worked_seconds"] += int((clock_out - clock_in).total_seconds())
+        if r["last_out"] is None or clock_out > r["last_out"]:
+            r["last_out"] = clock_out
+
+def rebuild_user_day(db: Session, user_id: int, day: date) -> None:
+    start_dt = datetime.combine(day, datetime.min.time())
+    end_dt = start_dt + timedelta(days=1)
+    Log = attendance_source(db, start_dt, end_dt, user_id)
+    rows = (
+        db.query(Log.user_id, Log.clock_in, Log.clock_out)
+        .filter(Log.user_id == user_id, Log.clock_in >= start_dt, Log.clock_in < end_dt)
+        .all()
+    )
+    db.execute(delete(AttendanceDaily).where(AttendanceDaily.user_id == user_id, AttendanceDaily.day == day))
+    acc: dict = {}
+    for row in rows:
+        _fold(acc, *row)
+    if acc:
+        db.execute(insert(AttendanceDaily), list(acc.values()))
+    attendance_stats.invalidate_days(day, day)
+
+def backfill(db: Session, start: date | None = None, end: date | None = None) -> int:
+    """
+    Rebuild rollups for [start, end] (inclusive; open-ended if omitted) by
+    streaming attendance_logs once. Returns the number of rollup rows written.
+    """
+    start_dt = datetime.combine(start, datetime.min.time()) if start else None
+    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time()) if end else None
+    Log = attendance_source(db, start_dt, end_dt)
+    query = db.query(Log.user_id, Log.clock_in, Log.clock_out)
+    wipe = delete(AttendanceDaily)
+    if start:
+        query = query.filter(Log.clock_in >= start_dt)
+        wipe = wipe.where(AttendanceDaily.day >= start)
+    if end:
+        query = query.filter(Log.clock_in < end_dt)
+        wipe = wipe.where(AttendanceDaily.day <= end)
+    db.execute(wipe)
+
+    written = 0
+    pending: dict = {}
+    current_user = None
+    for user_id, clock_in, clock_out in query.order_by(Log.user_id, Log.clock_in).yield_per(BACKFILL_CHUNK):
+        # Rows arrive grouped by user, so everything pending is complete once the next user starts
+        if user_id != current_user and len(pending) >= BACKFILL_CHUNK:
+            db.execute(insert(AttendanceDaily), list(pending.values()))
+            written += len(pending)
+            pending = {}
+        current_user = user_id
+        _fold(pending, user_id, clock_in, clock_out)
+    if pending:
+        db.execute(insert(AttendanceDaily), list(pending.values()))
+        written += len(pending)
+    db.commit()
+    attendance_stats.clear()
+    return written
+
+def main(argv=None) -> None:
+    from .database import Base, SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Rebuild the attendance_daily rollup table")
+    parser.add_argument("--start", help="first day to rebuild, YYYY-MM-DD")
+    parser.add_argument("--end", help="last day to rebuild, YYYY-MM-DD")
+    args = parser.parse_args(argv)
+    start = datetime.strptime(args.start, "%Y-%m-%d").date() if args.start else None
+    end = datetime.strptime(args.end, "%Y-%m-%d").date() if args.end else None
+
+    Base.metadata.create_all(bind=engine, tables=[AttendanceDaily.__table__])
+    db = SessionLocal()
+    try:
+        print(f"Wrote {backfill(db, start, end)} rollup rows")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,107 +1,173 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import datetime
-from ..database import get_db
+from datetime import datetime, timedelta
+from ..database import get_db, get_read_db
 from ..models import AttendanceLog, User
-from ..schemas import ClockInRequest, ClockOutRequest, AttendanceOut, AttendanceLogList
+from ..schemas import ClockInRequest, ClockOutRequest, AttendanceOut, AttendanceLogList, SyncRequest, SyncResponse
 from ..dependencies import get_current_user, require_admin
 from ..config import settings
-from ..utils import within_radius
+from ..utils import encode_cursor, decode_cursor
+from ..geofence import geofences
+from ..punch_ingest import punch_writer
+from ..presence import presence_board
+from ..today_state import today_state
+from ..stats import attendance_stats
+from ..rollups import record_clock_in, record_clock_out
+from ..punch_sync import sync_punches, utc_naive
+from ..fastjson import attendance_columns, attendance_list_response
+from ..archive import attendance_source
+from ..punches import attendance_out, clock_in_stmt, clock_out_stmt
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
 @router.post("/clock-in", response_model=AttendanceOut)
 def clock_in(payload: ClockInRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == payload.user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # Enforce location radius
-    if not within_radius(
-        payload.latitude, payload.longitude,
-        settings.INSTITUTION_LAT, settings.INSTITUTION_LON,
-        settings.MAX_RADIUS_METERS
-    ):
+    # Enforce site geofences
+    site = geofences.match(payload.latitude, payload.longitude)
+    if site is None or settings.PUNCH_GROUP_COMMIT:
+        # The conditional insert below checks the user itself; only these paths need a lookup
+        if not db.query(User.id).filter(User.id == payload.user_id).first():
+            raise HTTPException(status_code=404, detail="User not found")
+    if site is None:
         raise HTTPException(status_code=403, detail="Outside allowed location radius for clock-in")
 
-    entry = AttendanceLog(
-        user_id=user.id,
-        clock_in=datetime.utcnow(),
-        latitude_in=payload.latitude,
-        longitude_in=payload.longitude
-    )
-    db.add(entry)
+    now = datetime.utcnow()
+    if settings.PUNCH_GROUP_COMMIT:
+        values = dict(user_id=payload.user_id, clock_in=now,
+                      latitude_in=payload.latitude, longitude_in=payload.longitude, site_id_in=site.site_id)
+        db.close()  # hand our pooled connection back before waiting on the writer
+        try:
+            entry_id = punch_writer.submit(values).result()  # returns once the batch is committed
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="Already clocked in")
+        presence_board.clocked_in(payload.user_id)
+        today_state.clocked_in(payload.user_id, now)
+        return AttendanceOut(attendance_id=entry_id, **values)
+
+    try:
+        row = db.execute(clock_in_stmt(payload.user_id, now, payload.latitude, payload.longitude, site.site_id)).first()
+    except IntegrityError:
+        row = None  # a concurrent punch opened the session first
+    if row is None:
+        db.rollback()
+        if not db.query(User.id).filter(User.id == payload.user_id).first():
+            raise HTTPException(status_code=404, detail="User not found")
+        raise HTTPException(status_code=409, detail="Already clocked in")
+    record_clock_in(db, payload.user_id, now)
     db.commit()
-    db.refresh(entry)
-    return AttendanceOut(
-        attendance_id=entry.id, user_id=entry.user_id,
-        clock_in=entry.clock_in, clock_out=entry.clock_out,
-        latitude_in=entry.latitude_in, longitude_in=entry.longitude_in,
-        latitude_out=entry.latitude_out, longitude_out=entry.longitude_out
-    )
+    presence_board.clocked_in(payload.user_id)
+    today_state.clocked_in(payload.user_id, now)
+    return attendance_out(row)
 
 @router.post("/clock-out", response_model=AttendanceOut)
 def clock_out(payload: ClockOutRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    entry = (
-        db.query(AttendanceLog)
-        .filter(AttendanceLog.user_id == payload.user_id, AttendanceLog.clock_out == None)
-        .order_by(AttendanceLog.clock_in.desc())
-        .first()
-    )
-    if not entry:
-        raise HTTPException(status_code=404, detail="No active clock-in found")
-
-    # Enforce location radius
-    if not within_radius(
-        payload.latitude, payload.longitude,
-        settings.INSTITUTION_LAT, settings.INSTITUTION_LON,
-        settings.MAX_RADIUS_METERS
-    ):
+    # Enforce site geofences
+    site = geofences.match(payload.latitude, payload.longitude)
+    if site is None:
+        if not db.query(AttendanceLog.id).filter(AttendanceLog.user_id == payload.user_id, AttendanceLog.clock_out == None).first():
+            raise HTTPException(status_code=404, detail="No active clock-in found")
         raise HTTPException(status_code=403, detail="Outside allowed location radius for clock-out")
 
-    entry.clock_out = datetime.utcnow()
-    entry.latitude_out = payload.latitude
-    entry.longitude_out = payload.longitude
+    row = db.execute(clock_out_stmt(payload.user_id, datetime.utcnow(), payload.latitude, payload.longitude, site.site_id)).first()
+    if row is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="No active clock-in found")
+    entry = attendance_out(row)
+    record_clock_out(db, entry.user_id, entry.clock_in, entry.clock_out)
     db.commit()
-    db.refresh(entry)
-    return AttendanceOut(
-        attendance_id=entry.id, user_id=entry.user_id,
-        clock_in=entry.clock_in, clock_out=entry.clock_out,
-        latitude_in=entry.latitude_in, longitude_in=entry.longitude_in,
-        latitude_out=entry.latitude_out, longitude_out=entry.longitude_out
-    )
+    presence_board.clocked_out(entry.user_id)
+    today_state.clocked_out(entry.user_id, entry.clock_in, entry.clock_out)
+    return entry
+
+@router.post("/sync", response_model=SyncResponse)
+def sync(payload: SyncRequest, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    if len(payload.punches) > settings.SYNC_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.SYNC_MAX_ITEMS} punches per request")
+    results = sync_punches(db, payload.punches, current_user)
+
+    # Keep the live board in step for punches from today, replayed in time order
+    today = datetime.utcnow().date()
+    for result, punch in sorted(zip(results, payload.punches), key=lambda rp: utc_naive(rp[1].timestamp)):
+        if utc_naive(punch.timestamp).date() != today:
+            continue
+        if result.status == "created":
+            presence_board.clocked_in(punch.user_id)
+        elif result.status == "closed":
+            presence_board.clocked_out(punch.user_id)
+    for user_id in {p.user_id for r, p in zip(results, payload.punches) if r.status in {"created", "closed"}}:
+        today_state.invalidate(user_id)
+    applied = [utc_naive(p.timestamp) for r, p in zip(results, payload.punches) if r.status in {"created", "closed"}]
+    if applied:
+        # Closed sessions count toward the day they started, up to SYNC_LOOKBACK_HOURS earlier
+        earliest = min(applied) - timedelta(hours=settings.SYNC_LOOKBACK_HOURS)
+        attendance_stats.invalidate_days(earliest.date(), today)
+    return SyncResponse(results=results)
+
+def _page_of_logs(db: Session, user_id: int | None, cursor: str | None, limit: int,
+                  start_date: str | None, end_date: str | None):
+    """
+    Keyset pagination over (clock_in desc, id desc): each page costs the same
+    regardless of how much history sits behind it. Archived months are read
+    through attendance_source, bounded by the page's own range.
+    """
+    try:
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        end_dt = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1) if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # Nothing at or after the cursor can appear on this page
+        bound = after[0] + timedelta(microseconds=1)
+        end_dt = min(end_dt, bound) if end_dt else bound
+
+    Log = attendance_source(db, start_dt, end_dt, user_id)
+    query = db.query(*attendance_columns(Log))
+    if user_id is not None:
+        query = query.filter(Log.user_id == user_id)
+    if start_dt:
+        query = query.filter(Log.clock_in >= start_dt)
+    if end_dt:
+        query = query.filter(Log.clock_in < end_dt)
+    if after:
+        after_clock_in, after_id = after
+        query = query.filter(or_(
+            Log.clock_in < after_clock_in,
+            and_(Log.clock_in == after_clock_in, Log.id < after_id),
+        ))
+
+    rows = query.order_by(Log.clock_in.desc(), Log.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].clock_in, rows[-1].id)
+    return attendance_list_response(rows, next_cursor)
 
 @router.get("/logs", response_model=AttendanceLogList)
-def get_all_logs(_: User = Depends(require_admin), db: Session = Depends(get_db)):
-    logs = db.query(AttendanceLog).order_by(AttendanceLog.clock_in.desc()).all()
-    items = [
-        AttendanceOut(
-            attendance_id=l.id, user_id=l.user_id,
-            clock_in=l.clock_in, clock_out=l.clock_out,
-            latitude_in=l.latitude_in, longitude_in=l.longitude_in,
-            latitude_out=l.latitude_out, longitude_out=l.longitude_out
-        )
-        for l in logs
-    ]
-    return AttendanceLogList(items=items)
+def get_all_logs(cursor: str | None = None,
+                 limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                 start_date: str | None = None,
+                 end_date: str | None = None,
+                 _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    return _page_of_logs(db, None, cursor, limit, start_date, end_date)
 
 @router.get("/logs/{user_id}", response_model=AttendanceLogList)
-def get_user_logs(user_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def get_user_logs(user_id: int,
+                  cursor: str | None = None,
+                  limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                  start_date: str | None = None,
+                  end_date: str | None = None,
+                  current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user.role != "admin" and current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Not permitted")
-    logs = (
-        db.query(AttendanceLog)
-        .filter(AttendanceLog.user_id == user_id)
-        .order_by(AttendanceLog.clock_in.desc())
-        .all()
-    )
-    items = [
-        AttendanceOut(
-            attendance_id=l.id, user_id=l.user_id,
-            clock_in=l.clock_in, clock_out=l.clock_out,
-            latitude_in=l.latitude_in, longitude_in=l.longitude_in,
-            latitude_out=l.latitude_out, longitude_out=l.longitude_out
-        )
-        for l in logs
-    ]
-    return AttendanceLogList(items=items)
+    return _page_of_logs(db, user_id, cursor, limit, start_date, end_date)
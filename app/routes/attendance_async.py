@@ -0,0 +1,90 @@
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from ..database import get_async_db
+from ..models import AttendanceLog, User
+from ..schemas import ClockInRequest, ClockOutRequest, AttendanceOut
+from ..dependencies import get_current_user_async
+from ..config import settings
+from ..geofence import geofences
+from ..punch_ingest import punch_writer
+from ..presence import presence_board
+from ..today_state import today_state
+from ..rollups import record_clock_in, record_clock_out
+from ..punches import attendance_out, clock_in_stmt, clock_out_stmt
+
+# Async counterparts of the punch endpoints in attendance.py (same paths and payloads).
+# app.main mounts this router ahead of attendance.router when DB_ASYNC is enabled.
+router = APIRouter()
+
+@router.post("/clock-in", response_model=AttendanceOut)
+async def clock_in(payload: ClockInRequest,
+                   current_user: User = Depends(get_current_user_async),
+                   db: AsyncSession = Depends(get_async_db)):
+    # Enforce site geofences
+    site = geofences.match(payload.latitude, payload.longitude)
+    if site is None or settings.PUNCH_GROUP_COMMIT:
+        # The conditional insert below checks the user itself; only these paths need a lookup
+        if (await db.execute(select(User.id).where(User.id == payload.user_id))).first() is None:
+            raise HTTPException(status_code=404, detail="User not found")
+    if site is None:
+        raise HTTPException(status_code=403, detail="Outside allowed location radius for clock-in")
+
+    now = datetime.utcnow()
+    if settings.PUNCH_GROUP_COMMIT:
+        values = dict(user_id=payload.user_id, clock_in=now,
+                      latitude_in=payload.latitude, longitude_in=payload.longitude, site_id_in=site.site_id)
+        try:
+            entry_id = await asyncio.wrap_future(punch_writer.submit(values))
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="Already clocked in")
+        presence_board.clocked_in(payload.user_id)
+        today_state.clocked_in(payload.user_id, now)
+        return AttendanceOut(attendance_id=entry_id, **values)
+
+    try:
+        row = (await db.execute(
+            clock_in_stmt(payload.user_id, now, payload.latitude, payload.longitude, site.site_id)
+        )).first()
+    except IntegrityError:
+        row = None  # a concurrent punch opened the session first
+    if row is None:
+        await db.rollback()
+        if (await db.execute(select(User.id).where(User.id == payload.user_id))).first() is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        raise HTTPException(status_code=409, detail="Already clocked in")
+    await db.run_sync(record_clock_in, payload.user_id, now)
+    await db.commit()
+    presence_board.clocked_in(payload.user_id)
+    today_state.clocked_in(payload.user_id, now)
+    return attendance_out(row)
+
+@router.post("/clock-out", response_model=AttendanceOut)
+async def clock_out(payload: ClockOutRequest,
+                    current_user: User = Depends(get_current_user_async),
+                    db: AsyncSession = Depends(get_async_db)):
+    # Enforce site geofences
+    site = geofences.match(payload.latitude, payload.longitude)
+    if site is None:
+        open_session = (await db.execute(
+            select(AttendanceLog.id).where(AttendanceLog.user_id == payload.user_id, AttendanceLog.clock_out == None)
+        )).first()
+        if open_session is None:
+            raise HTTPException(status_code=404, detail="No active clock-in found")
+        raise HTTPException(status_code=403, detail="Outside allowed location radius for clock-out")
+
+    row = (await db.execute(
+        clock_out_stmt(payload.user_id, datetime.utcnow(), payload.latitude, payload.longitude, site.site_id)
+    )).first()
+    if row is None:
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="No active clock-in found")
+    entry = attendance_out(row)
+    await db.run_sync(record_clock_out, entry.user_id, entry.clock_in, entry.clock_out)
+    await db.commit()
+    presence_board.clocked_out(entry.user_id)
+    today_state.clocked_out(entry.user_id, entry.clock_in, entry.clock_out)
+    return entry
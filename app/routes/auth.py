@@ -3,16 +3,28 @@ from sqlalchemy.orm import Session
 from fastapi.security import OAuth2PasswordRequestForm
 from .. import models, schemas
 from ..database import get_db
-from ..security import hash_password, verify_password, create_access_token
+from ..config import settings
+from ..security import HashingBusy, hash_password, verify_password, create_access_token
 
 router = APIRouter()
 
+def hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Server busy, please retry shortly",
+        headers={"Retry-After": str(settings.HASH_RETRY_AFTER_SECONDS)},
+    )
+
 @router.post("/register", response_model=schemas.UserOut)
 def register_user(payload: schemas.UserCreate, db: Session = Depends(get_db)):
     existing = db.query(models.User).filter(models.User.username == payload.username).first()
     if existing:
         raise HTTPException(status_code=400, detail="Username already exists")
-    user = models.User(name=payload.name, username=payload.username, password=hash_password(payload.password), role=payload.role)
+    try:
+        hashed_pw = hash_password(payload.password)
+    except HashingBusy:
+        raise hashing_busy()
+    user = models.User(name=payload.name, username=payload.username, password=hashed_pw, role=payload.role)
     db.add(user)
     db.commit()
     db.refresh(user)
@@ -21,7 +33,11 @@ def register_user(payload: schemas.UserCreate, db: Session = Depends(get_db)):
 @router.post("/token", response_model=schemas.Token)
 def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = db.query(models.User).filter(models.User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password):
+    try:
+        valid = user is not None and verify_password(form_data.password, user.password)
+    except HashingBusy:
+        raise hashing_busy()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid username or password")
     token = create_access_token(username=user.username, role=user.role)
     return schemas.Token(access_token=token)
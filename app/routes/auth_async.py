@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import models, schemas
+from ..database import get_async_db
+from ..security import HashingBusy, verify_password_async, create_access_token
+from .auth import hashing_busy
+
+# Async counterpart of /token in auth.py. app.main mounts it ahead of auth.router when DB_ASYNC is enabled.
+router = APIRouter()
+
+@router.post("/token", response_model=schemas.Token)
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(),
+                                 db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(
+        select(models.User).where(models.User.username == form_data.username)
+    )).scalars().first()
+    try:
+        valid = user is not None and await verify_password_async(form_data.password, user.password)
+    except HashingBusy:
+        raise hashing_busy()
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid username or password")
+    token = create_access_token(username=user.username, role=user.role)
+    return schemas.Token(access_token=token)
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from ..database import get_db
+from ..models import User
+from ..schemas import ChangeFeed, ChangeOut
+from ..dependencies import require_admin
+from ..changes import read_changes
+from ..utils import encode_change_cursor, decode_change_cursor
+
+router = APIRouter()
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+@router.get("", response_model=ChangeFeed)
+def changes(since: str | None = None,
+            limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+            _: User = Depends(require_admin), db: Session = Depends(get_db)):
+    """Inserts and updates (clock-outs, user edits) since the `since` cursor; omit it to start from the beginning."""
+    # Read from the primary: the visibility watermark must come from the server the writes commit on
+    try:
+        cursor = decode_change_cursor(since) if since else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    items, position, has_more = read_changes(db, cursor, limit)
+    return ChangeFeed(
+        items=[ChangeOut(**item) for item in items],
+        next_cursor=encode_change_cursor(*position) if position else None,
+        has_more=has_more,
+    )
@@ -1,55 +1,222 @@
-from fastapi import APIRouter, Depends, Response
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
-from datetime import datetime
-from ..database import get_db
-from ..models import AttendanceLog, User
-from ..schemas import DailySummaryFilter, UserLogsFilter, AttendanceLogList, AttendanceOut
+from datetime import datetime, timedelta
+import csv
+import io
+import zlib
+from ..database import get_read_db
+from ..models import AttendanceDaily, User
+from ..schemas import (
+    DailySummaryFilter, UserLogsFilter, ExportRangeFilter, ColumnarExportFilter, AttendanceLogList,
+    RollupFilter, DailyRollupOut, DailyRollupList, UserTotalsOut, UserTotalsList,
+    StatsFilter, AttendanceStatsReport,
+    GeofenceAuditFilter, GeofenceAuditReport, AuditUserSummary, AuditFlagOut,
+)
+from ..archive import attendance_source
+from ..audit import run_audit
+from ..fastjson import attendance_list_response
+from ..columnar import COLUMNS as COLUMNAR_COLUMNS, FORMATS as COLUMNAR_FORMATS, iter_columnar
+from ..geofence import geofences
+from ..stats import attendance_stats
 from ..dependencies import require_admin
+from ..config import settings
 
 router = APIRouter()
 
+CSV_HEADER = ["attendance_id", "user_id", "clock_in", "clock_out"]
+
+def _summary_columns(Log) -> tuple:
+    # Summary reports only ever filled these four AttendanceOut fields
+    return (Log.id, Log.user_id, Log.clock_in, Log.clock_out)
+
+def _iter_csv(db: Session, start_dt: datetime, end_dt: datetime):
+    """
+    Yield CSV text one chunk at a time. Rows are read as plain tuples through a
+    server-side cursor so memory stays flat regardless of the range size.
+    """
+    Log = attendance_source(db, start_dt, end_dt)
+    query = (
+        db.query(*_summary_columns(Log))
+        .filter(Log.clock_in >= start_dt, Log.clock_in < end_dt)
+        .order_by(Log.clock_in.asc(), Log.id.asc())
+        .yield_per(settings.EXPORT_CHUNK_SIZE)
+    )
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    writer.writerow(CSV_HEADER)
+    pending = 0
+    for log_id, user_id, clock_in, clock_out in query:
+        writer.writerow([log_id, user_id, clock_in.isoformat(), clock_out.isoformat() if clock_out else ""])
+        pending += 1
+        if pending >= settings.EXPORT_CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    yield buf.getvalue()
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def _csv_response(db: Session, start_dt: datetime, end_dt: datetime, filename: str, gzip: bool = False):
+    chunks = _iter_csv(db, start_dt, end_dt)
+    if gzip:
+        return StreamingResponse(
+            _gzip_chunks(chunks),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv.gz"'},
+        )
+    return StreamingResponse(
+        chunks,
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+    )
+
 @router.post("/daily-summary", response_model=AttendanceLogList)
-def daily_summary(filter: DailySummaryFilter, _: User = Depends(require_admin), db: Session = Depends(get_db)):
+def daily_summary(filter: DailySummaryFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
     target = datetime.strptime(filter.date, "%Y-%m-%d").date()
     start_dt = datetime.combine(target, datetime.min.time())
     end_dt = datetime.combine(target, datetime.max.time())
-    logs = (
-        db.query(AttendanceLog)
-        .filter(AttendanceLog.clock_in >= start_dt, AttendanceLog.clock_in <= end_dt)
-        .order_by(AttendanceLog.clock_in.asc())
+    Log = attendance_source(db, start_dt, start_dt + timedelta(days=1))
+    rows = (
+        db.query(*_summary_columns(Log))
+        .filter(Log.clock_in >= start_dt, Log.clock_in <= end_dt)
+        .order_by(Log.clock_in.asc())
         .all()
     )
-    items = [AttendanceOut(attendance_id=l.id, user_id=l.user_id, clock_in=l.clock_in, clock_out=l.clock_out) for l in logs]
-    return AttendanceLogList(items=items)
+    return attendance_list_response(rows)
 
 @router.post("/user-range", response_model=AttendanceLogList)
-def user_range(filter: UserLogsFilter, _: User = Depends(require_admin), db: Session = Depends(get_db)):
-    query = db.query(AttendanceLog).filter(AttendanceLog.user_id == filter.user_id)
-    if filter.start_date:
-        start_dt = datetime.strptime(filter.start_date, "%Y-%m-%d")
-        query = query.filter(AttendanceLog.clock_in >= start_dt)
-    if filter.end_date:
-        end_dt = datetime.strptime(filter.end_date, "%Y-%m-%d")
-        query = query.filter(AttendanceLog.clock_in <= end_dt)
-    logs = query.order_by(AttendanceLog.clock_in.asc()).all()
-    items = [AttendanceOut(attendance_id=l.id, user_id=l.user_id, clock_in=l.clock_in, clock_out=l.clock_out) for l in logs]
-    return AttendanceLogList(items=items)
+def user_range(filter: UserLogsFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    start_dt = datetime.strptime(filter.start_date, "%Y-%m-%d") if filter.start_date else None
+    end_dt = datetime.strptime(filter.end_date, "%Y-%m-%d") if filter.end_date else None
+    Log = attendance_source(db, start_dt, end_dt + timedelta(days=1) if end_dt else None, filter.user_id)
+    query = db.query(*_summary_columns(Log)).filter(Log.user_id == filter.user_id)
+    if start_dt:
+        query = query.filter(Log.clock_in >= start_dt)
+    if end_dt:
+        query = query.filter(Log.clock_in <= end_dt)
+    rows = query.order_by(Log.clock_in.asc()).all()
+    return attendance_list_response(rows)
 
 @router.post("/export-csv")
-def export_csv(filter: DailySummaryFilter, _: User = Depends(require_admin), db: Session = Depends(get_db)):
+def export_csv(filter: DailySummaryFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
     target = datetime.strptime(filter.date, "%Y-%m-%d").date()
     start_dt = datetime.combine(target, datetime.min.time())
-    end_dt = datetime.combine(target, datetime.max.time())
-    logs = (
-        db.query(AttendanceLog)
-        .filter(AttendanceLog.clock_in >= start_dt, AttendanceLog.clock_in <= end_dt)
-        .order_by(AttendanceLog.clock_in.asc())
-        .all()
+    return _csv_response(db, start_dt, start_dt + timedelta(days=1), f"attendance_{filter.date}")
+
+@router.post("/export-csv/range")
+def export_csv_range(filter: ExportRangeFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    try:
+        start = datetime.strptime(filter.start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(filter.end_date or filter.start_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    start_dt = datetime.combine(start, datetime.min.time())
+    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    return _csv_response(db, start_dt, end_dt, f"attendance_{start}_{end}", gzip=filter.gzip)
+
+@router.post("/export-columnar")
+def export_columnar(filter: ColumnarExportFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    try:
+        start = datetime.strptime(filter.start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(filter.end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    columns = filter.columns or list(COLUMNAR_COLUMNS)
+    unknown = [c for c in columns if c not in COLUMNAR_COLUMNS]
+    if unknown or len(set(columns)) != len(columns):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Columns must be distinct values from: {', '.join(COLUMNAR_COLUMNS)}",
+        )
+
+    start_dt = datetime.combine(start, datetime.min.time())
+    end_dt = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    media_type, ext = COLUMNAR_FORMATS[filter.format]
+    return StreamingResponse(
+        iter_columnar(db, start_dt, end_dt, columns, filter.format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="attendance_{start}_{end}.{ext}"'},
+    )
+
+# ---------------- ROLLUPS (attendance_daily) ----------------
+def _rollup_range(filter: RollupFilter | StatsFilter):
+    try:
+        start = datetime.strptime(filter.start_date, "%Y-%m-%d").date()
+        end = datetime.strptime(filter.end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+    return start, end
+
+@router.post("/rollups/daily", response_model=DailyRollupList)
+def rollup_daily(filter: RollupFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    start, end = _rollup_range(filter)
+    query = db.query(AttendanceDaily).filter(AttendanceDaily.day >= start, AttendanceDaily.day <= end)
+    if filter.user_id is not None:
+        query = query.filter(AttendanceDaily.user_id == filter.user_id)
+    rows = query.order_by(AttendanceDaily.day.asc(), AttendanceDaily.user_id.asc()).all()
+    items = [
+        DailyRollupOut(
+            user_id=r.user_id, day=r.day, first_in=r.first_in, last_out=r.last_out,
+            worked_seconds=r.worked_seconds, punch_count=r.punch_count,
+            has_open_session=r.open_sessions > 0,
+        )
+        for r in rows
+    ]
+    return DailyRollupList(items=items)
+
+@router.post("/rollups/totals", response_model=UserTotalsList)
+def rollup_totals(filter: RollupFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    start, end = _rollup_range(filter)
+    query = (
+        db.query(
+            AttendanceDaily.user_id,
+            func.count(AttendanceDaily.day),
+            func.sum(AttendanceDaily.worked_seconds),
+            func.sum(AttendanceDaily.punch_count),
+        )
+        .filter(AttendanceDaily.day >= start, AttendanceDaily.day <= end)
+    )
+    if filter.user_id is not None:
+        query = query.filter(AttendanceDaily.user_id == filter.user_id)
+    rows = query.group_by(AttendanceDaily.user_id).order_by(AttendanceDaily.user_id.asc()).all()
+    items = [
+        UserTotalsOut(user_id=user_id, days_present=days, worked_seconds=worked or 0, punch_count=punches or 0)
+        for user_id, days, worked, punches in rows
+    ]
+    return UserTotalsList(items=items)
+
+# ---------------- STATISTICS ----------------
+@router.post("/stats", response_model=AttendanceStatsReport)
+def stats(filter: StatsFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    start, end = _rollup_range(filter)
+    return attendance_stats.compute(db, start, end, filter.group_by, filter.user_id, filter.role)
+
+# ---------------- GEOFENCE AUDIT ----------------
+@router.post("/geofence-audit", response_model=GeofenceAuditReport)
+def geofence_audit(filter: GeofenceAuditFilter, _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    try:
+        start = datetime.strptime(filter.start_date, "%Y-%m-%d").date() if filter.start_date else None
+        end = datetime.strptime(filter.end_date, "%Y-%m-%d").date() if filter.end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be in YYYY-MM-DD format")
+    result = run_audit(db, geofences.fences(), start, end, filter.user_id, filter.max_flagged)
+    return GeofenceAuditReport(
+        users=[AuditUserSummary(user_id=uid, **counts) for uid, counts in sorted(result["users"].items())],
+        flagged=[AuditFlagOut(**f) for f in result["flagged"]],
+        truncated=result["truncated"],
     )
-    lines = ["attendance_id,user_id,clock_in,clock_out"]
-    for l in logs:
-        clock_in = l.clock_in.isoformat()
-        clock_out = l.clock_out.isoformat() if l.clock_out else ""
-        lines.append(f"{l.id},{l.user_id},{clock_in},{clock_out}")
-    csv_data = "\n".join(lines)
-    return Response(content=csv_data, media_type="text/csv")
@@ -0,0 +1,58 @@
+import json
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from ..config import settings
+from ..database import get_db, SessionLocal
+from ..models import Site, User
+from ..schemas import SiteCreate, SiteOut, SiteList
+from ..dependencies import require_admin
+from ..geofence import geofences
+
+router = APIRouter()
+
+def _site_out(site: Site) -> SiteOut:
+    return SiteOut(
+        id=site.id, name=site.name, kind=site.kind,
+        latitude=site.latitude, longitude=site.longitude, radius_m=site.radius_m,
+        polygon=json.loads(site.polygon) if site.polygon else None, active=site.active,
+    )
+
+@router.get("/", response_model=SiteList)
+def list_sites(_: User = Depends(require_admin), db: Session = Depends(get_db)):
+    sites = db.query(Site).order_by(Site.id.asc()).all()
+    return SiteList(items=[_site_out(s) for s in sites])
+
+@router.post("/", response_model=SiteOut)
+def create_site(payload: SiteCreate, _: User = Depends(require_admin), db: Session = Depends(get_db)):
+    if payload.kind == "circle" and None in (payload.latitude, payload.longitude, payload.radius_m):
+        raise HTTPException(status_code=400, detail="Circle sites need latitude, longitude and radius_m")
+    if payload.kind == "circle" and payload.radius_m > settings.SITE_MAX_RADIUS_M:
+        raise HTTPException(status_code=400, detail=f"radius_m may not exceed {settings.SITE_MAX_RADIUS_M:g}")
+    if payload.kind == "polygon" and (not payload.polygon or len(payload.polygon) < 3
+                                      or any(len(p) != 2 for p in payload.polygon)):
+        raise HTTPException(status_code=400, detail="Polygon sites need at least 3 [lat, lon] vertices")
+    if db.query(Site).filter(Site.name == payload.name).first():
+        raise HTTPException(status_code=400, detail="Site name already exists")
+
+    site = Site(name=payload.name, kind=payload.kind, active=True)
+    if payload.kind == "circle":
+        site.latitude, site.longitude, site.radius_m = payload.latitude, payload.longitude, payload.radius_m
+    else:
+        site.polygon = json.dumps(payload.polygon)
+    db.add(site)
+    db.commit()
+    db.refresh(site)
+    geofences.reload(SessionLocal)
+    return _site_out(site)
+
+@router.delete("/{site_id}", response_model=SiteOut)
+def deactivate_site(site_id: int, _: User = Depends(require_admin), db: Session = Depends(get_db)):
+    # Punches reference sites, so they are deactivated rather than deleted
+    site = db.query(Site).filter(Site.id == site_id).first()
+    if not site:
+        raise HTTPException(status_code=404, detail="Site not found")
+    site.active = False
+    db.commit()
+    db.refresh(site)
+    geofences.reload(SessionLocal)
+    return _site_out(site)
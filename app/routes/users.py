@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
-from ..database import get_db
+from ..database import get_read_db
 from ..models import User
 from ..schemas import UserOut, UserList
 from ..dependencies import get_current_user, require_admin
+from ..user_search import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, search_users
 
 router = APIRouter()
 
@@ -12,6 +13,16 @@ def read_me(current_user: User = Depends(get_current_user)):
     return UserOut(id=current_user.id, name=current_user.name, username=current_user.username, role=current_user.role)
 
 @router.get("/list", response_model=UserList)
-def list_users(_: User = Depends(require_admin), db: Session = Depends(get_db)):
-    users = db.query(User).order_by(User.id.asc()).all()
-    return UserList(items=[UserOut(id=u.id, name=u.name, username=u.username, role=u.role) for u in users])
+def list_users(q: str | None = None,
+               cursor: str | None = None,
+               limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+               _: User = Depends(require_admin), db: Session = Depends(get_read_db)):
+    try:
+        after_id = int(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    rows, next_id = search_users(db, q, after_id, limit)
+    return UserList(
+        items=[UserOut(id=u.id, name=u.name, username=u.username, role=u.role) for u in rows],
+        next_cursor=str(next_id) if next_id is not None else None,
+    )
@@ -1,13 +1,15 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from ..assets import cached_page, register_asset_urls
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app/web/templates")
+register_asset_urls(templates)
 
 @router.get("/login", response_class=HTMLResponse)
 def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return cached_page(templates, request, "login.html")
 
 @router.get("/dashboard", response_class=HTMLResponse)
 def dashboard_page(request: Request):
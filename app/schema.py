@@ -0,0 +1,143 @@
+import logging
+from datetime import datetime
+from sqlalchemy import Column, inspect, select, text, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from .database import Base, dialect_insert
+from .models import AttendanceLog, SchemaVersion, User, next_change_seq
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a table, column or index is added. Startup compares this with the
+# stored version and only runs create_all()/add_missing_columns() when it is behind.
+SCHEMA_VERSION = 6
+
+# Nullable columns added to existing tables after their first release.
+# create_all() only creates missing tables, so these are added in place.
+ADDED_COLUMNS = [
+    ("attendance_logs", "site_id_in", "INTEGER REFERENCES sites(id)"),
+    ("attendance_logs", "site_id_out", "INTEGER REFERENCES sites(id)"),
+    ("attendance_logs", "change_seq", "BIGINT"),
+    ("attendance_logs", "changed_at", "TIMESTAMP"),
+    ("users", "change_seq", "BIGINT"),
+    ("users", "changed_at", "TIMESTAMP"),
+]
+
+def add_missing_columns(engine: Engine) -> list[str]:
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    for table, column, ddl in ADDED_COLUMNS:
+        if table not in tables:
+            continue
+        if column in {c["name"] for c in inspector.get_columns(table)}:
+            continue
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+        added.append(f"{table}.{column}")
+    return added
+
+# Indexes declared on existing tables after their first release, as
+# (table, index name, dialect it exists on or None for all).
+ADDED_INDEXES = [
+    ("attendance_logs", "uq_attendance_open_day_pg", "postgresql"),
+    ("attendance_logs", "uq_attendance_open_day_sqlite", "sqlite"),
+    ("attendance_logs", "ix_attendance_logs_change_seq", None),
+    ("users", "ix_users_change_seq", None),
+    ("users", "ix_users_name_trgm", "postgresql"),
+    ("users", "ix_users_username_trgm", "postgresql"),
+    ("users", "ix_users_name_nocase", "sqlite"),
+    ("users", "ix_users_username_nocase", "sqlite"),
+]
+
+# Indexes replaced by a later version, as (table, index name).
+RETIRED_INDEXES = [
+    ("attendance_logs", "uq_attendance_open_session"),  # v6: one open session per day, not per user
+]
+
+def drop_retired_indexes(engine: Engine) -> list[str]:
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    dropped = []
+    for table, name in RETIRED_INDEXES:
+        if table in tables and name in {i["name"] for i in inspector.get_indexes(table)}:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP INDEX {name}"))
+            dropped.append(name)
+    return dropped
+
+def add_missing_indexes(engine: Engine) -> list[str]:
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    added = []
+    for table, name, dialect in ADDED_INDEXES:
+        if table not in tables or dialect not in {None, engine.dialect.name}:
+            continue
+        if name in {i["name"] for i in inspector.get_indexes(table)}:
+            continue
+        index = next(i for i in Base.metadata.tables[table].indexes if i.name == name)
+        try:
+            with engine.begin() as conn:
+                index.create(conn)
+        except IntegrityError:
+            # Existing rows already violate it (e.g. a user with two open sessions).
+            # Keep the lookup fast without the guarantee until they are cleaned up.
+            where = index.dialect_options[engine.dialect.name]["where"]
+            columns = ", ".join(e.name if isinstance(e, Column) else str(e) for e in index.expressions)
+            with engine.begin() as conn:
+                conn.execute(text(f"CREATE INDEX {name} ON {table} ({columns}) WHERE {where}"))
+            logger.warning("Existing rows violate %s; created it as a non-unique index", name)
+        added.append(name)
+    return added
+
+def stamp_change_seq(engine: Engine) -> None:
+    """Give rows written before the change feed existed a change_seq, so a feed read from 0 includes them."""
+    with engine.begin() as conn:
+        for model in (User, AttendanceLog):
+            conn.execute(update(model).where(model.change_seq == None).values(change_seq=next_change_seq()))
+
+def stored_schema_version(engine: Engine) -> int | None:
+    if not inspect(engine).has_table(SchemaVersion.__tablename__):
+        return None
+    with engine.connect() as conn:
+        return conn.execute(select(SchemaVersion.version).where(SchemaVersion.id == 1)).scalar()
+
+def ensure_schema(engine: Engine) -> int:
+    """
+    Bring the database up to SCHEMA_VERSION and return the version in effect.
+    Costs one small query when it is already current.
+    """
+    current = stored_schema_version(engine)
+    if current is not None and current >= SCHEMA_VERSION:
+        if current > SCHEMA_VERSION:
+            logger.warning("Database schema version %s is newer than this build (%s)", current, SCHEMA_VERSION)
+        return current
+
+    if engine.dialect.name == "postgresql":
+        # For the trigram indexes on users; needs a role allowed to create extensions
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    Base.metadata.create_all(bind=engine)
+    added = add_missing_columns(engine)
+    dropped = drop_retired_indexes(engine)
+    indexes = add_missing_indexes(engine)
+    if engine.dialect.name == "postgresql" and current is not None and current < 5:
+        # change_seq moved from a sequence to transaction ids (v5); restamp so no row sits above new writes
+        with engine.begin() as conn:
+            for model in (User, AttendanceLog):
+                conn.execute(update(model).where(model.change_seq != None).values(change_seq=next_change_seq()))
+    stamp_change_seq(engine)
+    stmt = dialect_insert(engine.dialect.name)(SchemaVersion).values(
+        id=1, version=SCHEMA_VERSION, applied_at=datetime.utcnow()
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=[SchemaVersion.id],
+            set_={"version": stmt.excluded.version, "applied_at": stmt.excluded.applied_at},
+        ))
+    logger.info(
+        "Schema upgraded from %s to %s (added columns: %s; added indexes: %s; dropped indexes: %s)",
+        current, SCHEMA_VERSION, ", ".join(added) or "none", ", ".join(indexes) or "none",
+        ", ".join(dropped) or "none",
+    )
+    return SCHEMA_VERSION
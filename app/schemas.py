@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
 class Token(BaseModel):
     access_token: str
@@ -26,6 +26,7 @@ class UserOut(BaseModel):
 
 class UserList(BaseModel):
     items: List[UserOut]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
 
 class ClockInRequest(BaseModel):
     user_id: int
@@ -37,6 +38,26 @@ class ClockOutRequest(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
 
+class SyncPunch(BaseModel):
+    user_id: int
+    kind: str = Field(..., pattern="^(in|out)$")
+    timestamp: datetime  # when the punch happened on the device
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    clock_in: Optional[datetime] = None  # for "out": the session's clock-in, if the device knows it
+
+class SyncRequest(BaseModel):
+    punches: List[SyncPunch]
+
+class SyncItemResult(BaseModel):
+    index: int
+    status: str  # "created", "closed", "duplicate" or "rejected"
+    attendance_id: Optional[int] = None
+    detail: Optional[str] = None
+
+class SyncResponse(BaseModel):
+    results: List[SyncItemResult]
+
 class AttendanceOut(BaseModel):
     attendance_id: int
     user_id: int
@@ -46,14 +67,136 @@ class AttendanceOut(BaseModel):
     longitude_in: Optional[float] = None
     latitude_out: Optional[float] = None
     longitude_out: Optional[float] = None
+    site_id_in: Optional[int] = None
+    site_id_out: Optional[int] = None
 
 class AttendanceLogList(BaseModel):
     items: List[AttendanceOut]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= to fetch the next page
 
 class DailySummaryFilter(BaseModel):
     date: str  # "YYYY-MM-DD"
 
+class ExportRangeFilter(BaseModel):
+    start_date: str  # "YYYY-MM-DD"
+    end_date: Optional[str] = None  # inclusive; defaults to start_date
+    gzip: bool = False
+
+class ColumnarExportFilter(BaseModel):
+    start_date: str  # "YYYY-MM-DD", inclusive
+    end_date: str  # "YYYY-MM-DD", inclusive
+    format: str = Field("parquet", pattern="^(parquet|arrow)$")
+    columns: Optional[List[str]] = None  # defaults to every exportable column
+
 class UserLogsFilter(BaseModel):
     user_id: int
     start_date: Optional[str] = None
     end_date: Optional[str] = None
+
+class RollupFilter(BaseModel):
+    start_date: str  # "YYYY-MM-DD", inclusive
+    end_date: str  # "YYYY-MM-DD", inclusive
+    user_id: Optional[int] = None
+
+class DailyRollupOut(BaseModel):
+    user_id: int
+    day: date
+    first_in: datetime
+    last_out: Optional[datetime] = None
+    worked_seconds: int
+    punch_count: int
+    has_open_session: bool
+
+class DailyRollupList(BaseModel):
+    items: List[DailyRollupOut]
+
+class UserTotalsOut(BaseModel):
+    user_id: int
+    days_present: int
+    worked_seconds: int
+    punch_count: int
+
+class UserTotalsList(BaseModel):
+    items: List[UserTotalsOut]
+
+class StatsFilter(BaseModel):
+    start_date: str  # "YYYY-MM-DD", inclusive
+    end_date: str  # "YYYY-MM-DD", inclusive; capped at today
+    group_by: str = Field("user", pattern="^(user|role)$")
+    user_id: Optional[int] = None
+    role: Optional[str] = None
+
+class GroupStatsOut(BaseModel):
+    user_id: Optional[int] = None  # set when grouped by user
+    role: Optional[str] = None  # set when grouped by role
+    members: int
+    days_present: int
+    worked_seconds: int
+    hours_worked: float
+    average_arrival: Optional[str] = None  # "HH:MM:SS" UTC
+    attendance_rate: Optional[float] = None  # days present on working days / (members x working days)
+    punch_count: int
+
+class AttendanceStatsReport(BaseModel):
+    start_date: date
+    end_date: date
+    working_days: int
+    cached_days: int
+    items: List[GroupStatsOut]
+
+class ChangeOut(BaseModel):
+    kind: str  # "attendance" or "user"
+    change_seq: int
+    changed_at: Optional[datetime] = None
+    attendance: Optional[AttendanceOut] = None  # latest state of the row, for kind "attendance"
+    user: Optional[UserOut] = None  # for kind "user"
+
+class ChangeFeed(BaseModel):
+    items: List[ChangeOut]
+    next_cursor: Optional[str] = None  # pass back as ?since=; unchanged when there was nothing new
+    has_more: bool  # another page is ready now
+
+class SiteCreate(BaseModel):
+    name: str = Field(..., min_length=2, max_length=100)
+    kind: str = Field(..., pattern="^(circle|polygon)$")
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+    radius_m: Optional[float] = Field(None, gt=0)
+    polygon: Optional[List[List[float]]] = None  # [[lat, lon], ...], at least 3 vertices
+
+class SiteOut(BaseModel):
+    id: int
+    name: str
+    kind: str
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    radius_m: Optional[float] = None
+    polygon: Optional[List[List[float]]] = None
+    active: bool
+
+class SiteList(BaseModel):
+    items: List[SiteOut]
+
+class GeofenceAuditFilter(BaseModel):
+    start_date: Optional[str] = None  # "YYYY-MM-DD", inclusive
+    end_date: Optional[str] = None  # "YYYY-MM-DD", inclusive
+    user_id: Optional[int] = None
+    max_flagged: int = Field(1000, ge=0, le=100000)
+
+class AuditUserSummary(BaseModel):
+    user_id: int
+    punches: int
+    missing_coordinates: int
+    outside_fence: int
+
+class AuditFlagOut(BaseModel):
+    attendance_id: int
+    user_id: int
+    clock_in: datetime
+    direction: str  # "in" or "out"
+    reason: str  # "missing_coordinates" or "outside_fence"
+
+class GeofenceAuditReport(BaseModel):
+    users: List[AuditUserSummary]
+    flagged: List[AuditFlagOut]
+    truncated: bool
@@ -1,16 +1,138 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime, timedelta, timezone
 from jose import jwt
 from passlib.context import CryptContext
 from .config import settings
+from .metrics import Histogram
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-def hash_password(password: str) -> str:
+class HashingBusy(Exception):
+    """Raised when the password-hashing executor has no free slot."""
+
+# ---------------- PASSWORD HASHING ----------------
+# bcrypt is CPU-bound, so it runs on its own bounded pool instead of the request
+# threadpool. Callers beyond HASH_WORKERS + HASH_QUEUE_LIMIT are refused at once.
+_executor: Executor | None = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.HASH_WORKERS + settings.HASH_QUEUE_LIMIT)
+_in_flight = 0
+_rejected = 0
+hash_latency = Histogram()
+
+def _get_executor() -> Executor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if settings.HASH_EXECUTOR == "process":
+                _executor = ProcessPoolExecutor(max_workers=settings.HASH_WORKERS)
+            else:
+                _executor = ThreadPoolExecutor(max_workers=settings.HASH_WORKERS, thread_name_prefix="pwhash")
+        return _executor
+
+def shutdown_hash_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+def _hash(password: str) -> str:
     return pwd_context.hash(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+def _verify(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+def _admit(blocking: bool = False) -> float:
+    global _in_flight, _rejected
+    if not _slots.acquire(blocking=blocking):
+        with _executor_lock:
+            _rejected += 1
+        raise HashingBusy()
+    with _executor_lock:
+        _in_flight += 1
+    return time.perf_counter()
+
+def _release(started: float) -> None:
+    global _in_flight
+    hash_latency.observe(time.perf_counter() - started)
+    with _executor_lock:
+        _in_flight -= 1
+    _slots.release()
+
+def _run_bounded(fn, *args):
+    started = _admit()
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        _release(started)
+
+async def _run_bounded_async(fn, *args):
+    started = _admit()
+    try:
+        return await asyncio.wrap_future(_get_executor().submit(fn, *args))
+    finally:
+        _release(started)
+
+def hash_executor_stats() -> dict:
+    with _executor_lock:
+        in_flight, rejected = _in_flight, _rejected
+    return {
+        "workers": settings.HASH_WORKERS,
+        "in_flight": in_flight,
+        "queue_depth": max(in_flight - settings.HASH_WORKERS, 0),
+        "rejected": rejected,
+        "latency": hash_latency.snapshot(),
+    }
+
+def hash_passwords_bulk(passwords: list[str]) -> list[str]:
+    """
+    Hash many passwords for admin imports on the shared hashing executor. Up to
+    BULK_HASH_WORKERS hashes (at most HASH_WORKERS) are in flight, each holding
+    an admission slot, so imports and logins together stay within the pool's
+    bound. Raises HashingBusy when no slot is free to start.
+    """
+    window = max(1, min(settings.BULK_HASH_WORKERS, settings.HASH_WORKERS))
+    hashes: list[str] = []
+    in_flight: deque = deque()  # (started, future)
+    try:
+        for i, password in enumerate(passwords):
+            if len(in_flight) >= window:
+                started, future = in_flight.popleft()
+                try:
+                    hashes.append(future.result())
+                finally:
+                    _release(started)
+            # Only the first slot is refused at once; later ones wait for a free worker
+            started = _admit(blocking=i > 0)
+            in_flight.append((started, _get_executor().submit(_hash, password)))
+        while in_flight:
+            started, future = in_flight.popleft()
+            try:
+                hashes.append(future.result())
+            finally:
+                _release(started)
+    finally:
+        for started, future in in_flight:
+            future.cancel()
+            wait([future])
+            _release(started)
+    return hashes
+
+def hash_password(password: str) -> str:
+    return _run_bounded(_hash, password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return _run_bounded(_verify, plain_password, hashed_password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_bounded_async(_verify, plain_password, hashed_password)
+
+# ---------------- TOKENS ----------------
 def create_access_token(username: str, role: str) -> str:
     expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode = {"sub": username, "role": role, "exp": expire}
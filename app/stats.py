@@ -0,0 +1,134 @@
+"""
+Attendance statistics per user or role over a date range, aggregated in SQL
+from the attendance_daily rollup.
+
+Each day is reduced to one row per group by a GROUP BY query. A day before
+today with no open session no longer changes as staff punch, so its group rows
+are cached (bounded by STATS_CACHE_DAYS, for STATS_CACHE_TTL_SECONDS) and a
+repeated quarter only queries the days still missing, normally just today.
+Offline sync, rollup rebuilds and role changes invalidate in this process;
+the TTL covers rewrites made by other processes.
+"""
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from .cache import TTLCache
+from .config import settings
+from .models import AttendanceDaily, User
+
+GROUP_KEYS = {"user": User.id, "role": User.role}
+GROUP_FIELDS = {"user": "user_id", "role": "role"}
+
+def _seconds_after_midnight(column, dialect_name: str):
+    if dialect_name == "postgresql":
+        return func.extract("epoch", column - func.date_trunc("day", column))
+    return (func.julianday(column) - func.julianday(func.date(column))) * 86400
+
+def working_days(start: date, end: date) -> int:
+    return sum((start + timedelta(days=n)).weekday() in settings.STATS_WORKDAYS for n in range((end - start).days + 1))
+
+def _clock(seconds: float) -> str:
+    return (datetime.combine(date.min, time()) + timedelta(seconds=round(seconds))).strftime("%H:%M:%S")
+
+class AttendanceStats:
+    def __init__(self, maxsize: int, ttl: float):
+        self._days = TTLCache(maxsize=maxsize, ttl=ttl or float("inf"))  # (group_by, day) -> {key: totals}
+
+    def _aggregate(self, db: Session, group_by: str, days: list[date]) -> tuple[dict, set]:
+        """{day: {key: (present, worked_seconds, arrival_seconds, punches)}} for `days`, and the days with open sessions."""
+        key = GROUP_KEYS[group_by]
+        arrival = _seconds_after_midnight(AttendanceDaily.first_in, db.get_bind().dialect.name)
+        rows = (
+            db.query(
+                AttendanceDaily.day, key, func.count(AttendanceDaily.user_id),
+                func.sum(AttendanceDaily.worked_seconds), func.sum(arrival),
+                func.sum(AttendanceDaily.punch_count), func.sum(AttendanceDaily.open_sessions),
+            )
+            .join(User, User.id == AttendanceDaily.user_id)
+            .filter(AttendanceDaily.day >= days[0], AttendanceDaily.day <= days[-1])
+            .group_by(AttendanceDaily.day, key)
+        )
+        per_day: dict[date, dict] = {d: {} for d in days}
+        open_days = set()
+        for day, k, present, worked, arrival_sum, punches, open_sessions in rows:
+            if day not in per_day:
+                continue  # inside the span but already cached
+            per_day[day][k] = (present, worked or 0, float(arrival_sum or 0), punches or 0)
+            if open_sessions:
+                open_days.add(day)
+        return per_day, open_days
+
+    def day_groups(self, db: Session, group_by: str, start: date, end: date) -> tuple[dict, int]:
+        """Per-day group totals for [start, end], and how many of the days came from the cache."""
+        today = datetime.utcnow().date()
+        result, missing = {}, []
+        for n in range((end - start).days + 1):
+            day = start + timedelta(days=n)
+            cached = self._days.get((group_by, day))
+            if cached is None:
+                missing.append(day)
+            else:
+                result[day] = cached
+        if missing:
+            fresh, open_days = self._aggregate(db, group_by, missing)
+            for day, groups in fresh.items():
+                result[day] = groups
+                if day < today and day not in open_days:
+                    self._days.set((group_by, day), groups)
+        return result, len(result) - len(missing)
+
+    def compute(self, db: Session, start: date, end: date, group_by: str = "user",
+                user_id: int | None = None, role: str | None = None) -> dict:
+        """
+        Hours worked, days present, average arrival (UTC) and attendance rate per
+        group. The rate is days present on working days over members x working days.
+        """
+        end = min(end, datetime.utcnow().date())
+        key = GROUP_KEYS[group_by]
+        members_query = db.query(key, func.count(User.id)).group_by(key)
+        if user_id is not None:
+            members_query = members_query.filter(User.id == user_id)
+        if role is not None:
+            members_query = members_query.filter(User.role == role)
+        members = dict(members_query.all())
+
+        per_day, cached_days = self.day_groups(db, group_by, start, end) if end >= start else ({}, 0)
+        totals = {k: [0, 0, 0, 0.0, 0] for k in members}  # present, present on workdays, worked, arrival, punches
+        for day, groups in per_day.items():
+            workday = day.weekday() in settings.STATS_WORKDAYS
+            for k, (present, worked, arrival, punches) in groups.items():
+                t = totals.get(k)
+                if t is None:
+                    continue
+                t[0] += present
+                t[1] += present if workday else 0
+                t[2] += worked
+                t[3] += arrival
+                t[4] += punches
+
+        workdays = working_days(start, end) if end >= start else 0
+        items = []
+        for k in sorted(totals):
+            present, on_workdays, worked, arrival, punches = totals[k]
+            expected = members[k] * workdays
+            items.append({
+                GROUP_FIELDS[group_by]: k,
+                "members": members[k],
+                "days_present": present,
+                "worked_seconds": worked,
+                "hours_worked": round(worked / 3600, 2),
+                "average_arrival": _clock(arrival / present) if present else None,
+                "attendance_rate": round(on_workdays / expected, 4) if expected else None,
+                "punch_count": punches,
+            })
+        return {"start_date": start, "end_date": end, "working_days": workdays, "cached_days": cached_days, "items": items}
+
+    def invalidate_days(self, start: date, end: date) -> None:
+        for n in range((end - start).days + 1):
+            for group_by in GROUP_KEYS:
+                self._days.pop((group_by, start + timedelta(days=n)))
+
+    def clear(self) -> None:
+        self._days.clear()
+
+attendance_stats = AttendanceStats(settings.STATS_CACHE_DAYS, settings.STATS_CACHE_TTL_SECONDS)
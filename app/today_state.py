@@ -0,0 +1,128 @@
+"""
+Per-user "today" state for the staff dashboard: the latest punch of the day.
+
+Punch handlers write the new state straight into the cache, so the dashboard
+they redirect to (and every reload after it) is served without a query.
+Backends:
+
+- "memory" (default): TTLCache per process. With several workers a punch only
+  updates the worker that handled it; others catch up within TODAY_CACHE_TTL_SECONDS.
+- "redis": shared by every worker via REDIS_URL. If Redis is unreachable the
+  dashboard falls back to the database query and writes are skipped.
+"""
+import json
+import logging
+from datetime import date, datetime
+from sqlalchemy.orm import Session
+from .cache import TTLCache
+from .config import settings
+from .models import AttendanceLog
+
+logger = logging.getLogger(__name__)
+
+class MemoryBackend:
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id: int) -> dict | None:
+        return self._cache.get(user_id)
+
+    def set(self, user_id: int, state: dict) -> None:
+        self._cache.set(user_id, state)
+
+    def delete(self, user_id: int) -> None:
+        self._cache.pop(user_id)
+
+class RedisBackend:
+    def __init__(self, url: str, ttl: float, prefix: str = "today:"):
+        import redis
+
+        self._client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._errors = redis.RedisError
+        self._ttl = int(ttl)
+        self._prefix = prefix
+
+    def get(self, user_id: int) -> dict | None:
+        try:
+            raw = self._client.get(f"{self._prefix}{user_id}")
+        except self._errors as exc:
+            logger.warning("Today cache read failed, querying the database: %s", exc)
+            return None
+        return json.loads(raw) if raw else None
+
+    def set(self, user_id: int, state: dict) -> None:
+        try:
+            self._client.set(f"{self._prefix}{user_id}", json.dumps(state), ex=self._ttl)
+        except self._errors as exc:
+            logger.warning("Today cache write failed: %s", exc)
+
+    def delete(self, user_id: int) -> None:
+        try:
+            self._client.delete(f"{self._prefix}{user_id}")
+        except self._errors as exc:
+            logger.warning("Today cache delete failed: %s", exc)
+
+def _make_backend():
+    if settings.TODAY_CACHE_BACKEND == "redis":
+        return RedisBackend(settings.REDIS_URL, settings.TODAY_CACHE_TTL_SECONDS)
+    if settings.TODAY_CACHE_BACKEND == "memory":
+        return MemoryBackend(settings.TODAY_CACHE_SIZE, settings.TODAY_CACHE_TTL_SECONDS)
+    raise ValueError(f"Unknown TODAY_CACHE_BACKEND {settings.TODAY_CACHE_BACKEND!r}")
+
+def _state(day: date, clock_in: datetime | None, clock_out: datetime | None) -> dict:
+    return {
+        "day": day.isoformat(),
+        "clock_in": clock_in.isoformat() if clock_in else None,
+        "clock_out": clock_out.isoformat() if clock_out else None,
+    }
+
+class TodayStateCache:
+    def __init__(self):
+        self._backend = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = _make_backend()
+        return self._backend
+
+    def get(self, db: Session, user_id: int) -> dict:
+        """
+        {"day", "clock_in", "clock_out"} for today (times as ISO strings, None when
+        absent), loading the user's latest punch on a miss or a new day.
+        """
+        today = datetime.utcnow().date()
+        state = self.backend.get(user_id)
+        if state is not None and state["day"] == today.isoformat():
+            return state
+        latest = (
+            db.query(AttendanceLog.clock_in, AttendanceLog.clock_out)
+            .filter(AttendanceLog.user_id == user_id)
+            .order_by(AttendanceLog.clock_in.desc())
+            .first()
+        )
+        if latest and latest.clock_in.date() == today:
+            state = _state(today, latest.clock_in, latest.clock_out)
+        else:
+            state = _state(today, None, None)
+        self.backend.set(user_id, state)
+        return state
+
+    def clocked_in(self, user_id: int, clock_in: datetime) -> None:
+        if clock_in.date() == datetime.utcnow().date():
+            self.backend.set(user_id, _state(clock_in.date(), clock_in, None))
+        else:
+            self.backend.delete(user_id)
+
+    def clocked_out(self, user_id: int, clock_in: datetime, clock_out: datetime) -> None:
+        state = self.backend.get(user_id)
+        if state is not None and state["clock_in"] == clock_in.isoformat():
+            self.backend.set(user_id, _state(clock_in.date(), clock_in, clock_out))
+        else:
+            # Closed a session the cache was not showing (e.g. opened yesterday); reload on next view
+            self.backend.delete(user_id)
+
+    def invalidate(self, user_id: int) -> None:
+        self.backend.delete(user_id)
+
+today_state = TodayStateCache()
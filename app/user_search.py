@@ -0,0 +1,39 @@
+"""
+Paged user search for the DB-admin panel and /users/list.
+
+`q` matches name or username case-insensitively: anywhere in the value on
+PostgreSQL (ILIKE, served by the pg_trgm GIN indexes) and as a prefix on
+SQLite, where only a prefix LIKE can use the NOCASE indexes. Pages are keyset
+on id, so a deep page costs the same as the first.
+"""
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from .models import User
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_users(db: Session, q: str | None = None, after_id: int | None = None,
+                 limit: int = DEFAULT_PAGE_SIZE) -> tuple[list, int | None]:
+    """
+    Rows of (id, name, username, role) ordered by id, and the id to pass as
+    `after_id` for the next page (None on the last one).
+    """
+    query = db.query(User.id, User.name, User.username, User.role)
+    q = (q or "").strip()
+    if q:
+        if db.get_bind().dialect.name == "postgresql":
+            pattern = f"%{_escape_like(q)}%"
+            query = query.filter(or_(User.name.ilike(pattern, escape="\\"), User.username.ilike(pattern, escape="\\")))
+        else:
+            pattern = f"{_escape_like(q)}%"
+            query = query.filter(or_(User.name.like(pattern, escape="\\"), User.username.like(pattern, escape="\\")))
+    if after_id is not None:
+        query = query.filter(User.id > after_id)
+    rows = query.order_by(User.id.asc()).limit(limit + 1).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1].id
+    return rows, None
@@ -1,4 +1,6 @@
+import base64
 import math
+from datetime import datetime
 
 def haversine_distance_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     """
@@ -17,3 +19,39 @@ def within_radius(lat: float | None, lon: float | None, ref_lat: float, ref_lon:
     if lat is None or lon is None:
         return False
     return haversine_distance_meters(lat, lon, ref_lat, ref_lon) <= max_radius_m
+
+def encode_cursor(clock_in: datetime, row_id: int) -> str:
+    """
+    Encode a (clock_in, id) keyset position as an opaque, URL-safe token.
+    """
+    raw = f"{clock_in.isoformat()}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Inverse of encode_cursor. Raises ValueError on a malformed token.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        clock_in, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return datetime.fromisoformat(clock_in), int(row_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+def encode_change_cursor(change_seq: int, kind: str, row_id: int) -> str:
+    """
+    Encode a change-feed position (change_seq, kind, id) as an opaque, URL-safe token.
+    """
+    raw = f"{change_seq}|{kind}|{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_change_cursor(cursor: str) -> tuple[int, str, int]:
+    """
+    Inverse of encode_change_cursor. Raises ValueError on a malformed token.
+    """
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        change_seq, kind, row_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return int(change_seq), kind, int(row_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
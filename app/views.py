@@ -1,35 +1,69 @@
-from fastapi import APIRouter, Request, Form, Depends
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, Request, Form, Depends, File, UploadFile
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from starlette.status import HTTP_302_FOUND
 from fastapi.templating import Jinja2Templates
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from . import models, database
-import bcrypt
+from .bulk_import import ImportFormatError, parse_user_rows, import_users
+from .config import settings
+from .dependencies import invalidate_principal
+from .security import HashingBusy, hash_executor_stats, hash_password, verify_password
+from .metrics import render_prometheus, slow_query_report
+from .assets import cached_page, register_asset_urls
+from .punch_ingest import punch_writer
+from .presence import presence_board
+from .today_state import today_state
+from .stats import attendance_stats
+from .user_search import search_users
+from .rollups import record_clock_in, record_clock_out
+from .geofence import geofences
+from .punches import ALREADY_CLOCKED_IN, clock_in_stmt, clock_out_stmt
 from datetime import datetime
+import asyncio
+import hmac
+import json
 
 templates = Jinja2Templates(directory="app/web/templates")
+register_asset_urls(templates)
+
+def warm_templates() -> int:
+    """Load and compile every template into the Jinja cache before the first request."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
 router = APIRouter()
 
 # ---------------- AUTH ----------------
 def authenticate(username: str, password: str, db: Session):
     user = db.query(models.User).filter(models.User.username == username).first()
-    if user and bcrypt.checkpw(password.encode("utf-8"), user.password.encode("utf-8")):
+    if user and verify_password(password, user.password):
         return user
     return None
 
 # ---------------- LOGIN/LOGOUT ----------------
 @router.get("/login")
 def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return cached_page(templates, request, "login.html")
 
 @router.post("/login")
 def login_submit(request: Request,
                  username: str = Form(...),
                  password: str = Form(...),
                  db: Session = Depends(database.get_db)):
-    user = authenticate(username, password, db)
+    try:
+        user = authenticate(username, password, db)
+    except HashingBusy:
+        return cached_page(
+            templates, request, "login.html",
+            status_code=503,
+            headers={"Retry-After": str(settings.HASH_RETRY_AFTER_SECONDS)},
+            error="Server busy, please try again in a moment",
+        )
     if not user:
-        return templates.TemplateResponse("login.html", {"request": request, "error": "Invalid credentials"})
+        return cached_page(templates, request, "login.html", error="Invalid credentials")
 
     # Store session info
     request.session["user_id"] = user.id
@@ -57,22 +91,22 @@ def staff_dashboard(request: Request, db: Session = Depends(database.get_db)):
     if not user_id:
         return RedirectResponse("/login", status_code=HTTP_302_FOUND)
 
-    # Get today's most recent attendance
+    # Today's most recent attendance (cached; punch handlers keep it current)
     today = datetime.utcnow().date()
-    latest = db.query(models.AttendanceLog).filter(
-        models.AttendanceLog.user_id == user_id
-    ).order_by(models.AttendanceLog.clock_in.desc()).first()
+    state = today_state.get(db, user_id)
 
     my_today = {"clock_in": None, "clock_out": None, "status": "Absent", "status_class": "absent"}
-    if latest and latest.clock_in.date() == today:
-        my_today["clock_in"] = latest.clock_in.strftime("%H:%M")
-        my_today["clock_out"] = latest.clock_out.strftime("%H:%M") if latest.clock_out else None
-        my_today["status"] = "Present" if latest.clock_out else "Working"
-        my_today["status_class"] = "present" if latest.clock_out else "working"
+    if state["clock_in"]:
+        clock_out = state["clock_out"]
+        my_today["clock_in"] = datetime.fromisoformat(state["clock_in"]).strftime("%H:%M")
+        my_today["clock_out"] = datetime.fromisoformat(clock_out).strftime("%H:%M") if clock_out else None
+        my_today["status"] = "Present" if clock_out else "Working"
+        my_today["status_class"] = "present" if clock_out else "working"
 
     return templates.TemplateResponse(
         "dashboard.html",
-        {"request": request, "today_date": today, "my_today": my_today, "name": name}
+        {"request": request, "today_date": today, "my_today": my_today, "name": name,
+         "error": request.session.pop("punch_error", None)}
     )
 
 @router.post("/attendance/clock-in")
@@ -84,15 +118,39 @@ def clock_in(request: Request,
     if not user_id:
         return RedirectResponse("/login", status_code=HTTP_302_FOUND)
 
-    log = models.AttendanceLog(
-        user_id=user_id,
-        latitude_in=latitude,
-        longitude_in=longitude,
-        clock_in=datetime.utcnow()
-    )
-    db.add(log)
+    # Web punches are not rejected off-site, but the matched site is recorded
+    site = geofences.match(latitude, longitude)
+    site_id = site.site_id if site else None
+
+    now = datetime.utcnow()
+    if settings.PUNCH_GROUP_COMMIT:
+        try:
+            punch_writer.submit(dict(
+                user_id=user_id, latitude_in=latitude, longitude_in=longitude, clock_in=now,
+                site_id_in=site_id,
+            )).result()  # wait until the batch is committed
+        except IntegrityError:
+            # Already clocked in today (double submit)
+            request.session["punch_error"] = ALREADY_CLOCKED_IN
+            return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
+        presence_board.clocked_in(user_id)
+        today_state.clocked_in(user_id, now)
+        database.note_write(request)
+        return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
+
+    try:
+        row = db.execute(clock_in_stmt(user_id, now, latitude, longitude, site_id)).first()
+    except IntegrityError:
+        row = None
+    if row is None:
+        db.rollback()
+        request.session["punch_error"] = ALREADY_CLOCKED_IN
+        return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
+    record_clock_in(db, user_id, now)
     db.commit()
-    db.refresh(log)
+    presence_board.clocked_in(user_id)
+    today_state.clocked_in(user_id, now)
+    database.note_write(request)
     return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
 
 @router.post("/attendance/clock-out")
@@ -104,40 +162,113 @@ def clock_out(request: Request,
     if not user_id:
         return RedirectResponse("/login", status_code=HTTP_302_FOUND)
 
-    log = db.query(models.AttendanceLog).filter(
-        models.AttendanceLog.user_id == user_id,
-        models.AttendanceLog.clock_out == None
-    ).order_by(models.AttendanceLog.clock_in.desc()).first()
-    if log:
-        log.clock_out = datetime.utcnow()
-        log.latitude_out = latitude
-        log.longitude_out = longitude
+    site = geofences.match(latitude, longitude)
+    row = db.execute(clock_out_stmt(user_id, datetime.utcnow(), latitude, longitude, site.site_id if site else None)).first()
+    if row:
+        record_clock_out(db, user_id, row.clock_in, row.clock_out)
         db.commit()
-        db.refresh(log)
+        presence_board.clocked_out(user_id)
+        today_state.clocked_out(user_id, row.clock_in, row.clock_out)
+        database.note_write(request)
     return RedirectResponse("/web/dashboard", status_code=HTTP_302_FOUND)
 
 # ---------------- SCHOOL ADMIN DASHBOARD ----------------
 @router.get("/web/admin")
-def admin_dashboard(request: Request, db: Session = Depends(database.get_db)):
+def admin_dashboard(request: Request):
     role = request.session.get("role")
     if role not in {"admin", "db_admin"}:
         return RedirectResponse("/login", status_code=HTTP_302_FOUND)
 
-    present = db.query(models.AttendanceLog).filter(models.AttendanceLog.clock_in != None).count()
-    total_users = db.query(models.User).count()
-    absent = max(total_users - present, 0)
-    summary = {"present": present, "late": 0, "absent": absent}
-
+    # Seeded once and then maintained in-process, so it must come from the primary, not a replica
+    presence_board.ensure_loaded(database.SessionLocal)
+    summary = presence_board.summary()
     return templates.TemplateResponse("admin.html", {"request": request, "summary": summary})
 
+@router.get("/web/admin/presence/stream")
+async def presence_stream(request: Request):
+    role = request.session.get("role")
+    if role not in {"admin", "db_admin"}:
+        return RedirectResponse("/login", status_code=HTTP_302_FOUND)
+
+    await run_in_threadpool(presence_board.ensure_loaded, database.SessionLocal)
+    queue = presence_board.subscribe()
+
+    async def events():
+        try:
+            yield f"event: presence\ndata: {json.dumps({'summary': presence_board.summary()})}\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: presence\ndata: {payload}\n\n"
+        finally:
+            presence_board.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ---------------- METRICS ----------------
+def _metrics_denied(request: Request) -> Response | None:
+    if not settings.METRICS_ENABLED:
+        return Response(status_code=404)
+    if settings.METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+            return Response(status_code=401, headers={"WWW-Authenticate": "Bearer"})
+        return None
+    # No scrape token configured: only signed-in admins (slow-queries exposes SQL text)
+    if request.session.get("role") not in {"admin", "db_admin"}:
+        return Response(status_code=401)
+    return None
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    denied = _metrics_denied(request)
+    if denied:
+        return denied
+    return PlainTextResponse(render_prometheus(hash_executor_stats()), media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/slow-queries", include_in_schema=False)
+def slow_queries(request: Request):
+    denied = _metrics_denied(request)
+    if denied:
+        return denied
+    return JSONResponse(slow_query_report())
+
 # ---------------- DB ADMIN PANEL ----------------
+def _db_admin_page(request: Request, db: Session, q: str | None = None, after: int | None = None,
+                   status_code: int = 200, headers: dict | None = None, **context):
+    """Render db_admin.html with one page of the user list (see user_search)."""
+    users, next_after = search_users(db, q, after)
+    return templates.TemplateResponse(
+        "db_admin.html",
+        {"request": request, "users": users, "q": q or "", "after": after, "next_after": next_after, **context},
+        status_code=status_code,
+        headers=headers,
+    )
+
+def _redirect_with_message(request: Request, message: str) -> RedirectResponse:
+    # Post/redirect/get: the list is re-read by GET /db-admin, not re-rendered here
+    request.session["flash"] = message
+    return RedirectResponse("/db-admin", status_code=HTTP_302_FOUND)
+
+def _hashing_busy_response(request: Request, db: Session):
+    return _db_admin_page(
+        request, db, error="Server busy hashing passwords, please retry shortly",
+        status_code=503, headers={"Retry-After": str(settings.HASH_RETRY_AFTER_SECONDS)},
+    )
+
 @router.get("/db-admin")
-def db_admin(request: Request, db: Session = Depends(database.get_db)):
+def db_admin(request: Request, q: str | None = None, after: int | None = None,
+             db: Session = Depends(database.get_read_db)):
     role = request.session.get("role")
     if role != "db_admin":
         return RedirectResponse("/login", status_code=HTTP_302_FOUND)
-    users = db.query(models.User).all()
-    return templates.TemplateResponse("db_admin.html", {"request": request, "users": users})
+    return _db_admin_page(request, db, q, after, success=request.session.pop("flash", None))
 
 @router.post("/db-admin/users")
 def create_user(request: Request,
@@ -153,22 +284,47 @@ def create_user(request: Request,
 
     existing = db.query(models.User).filter(models.User.username == username).first()
     if existing:
-        users = db.query(models.User).all()
-        return templates.TemplateResponse(
-            "db_admin.html",
-            {"request": request, "users": users, "error": f"Username '{username}' already exists"}
-        )
+        return _db_admin_page(request, db, error=f"Username '{username}' already exists")
 
-    hashed_pw = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    try:
+        hashed_pw = hash_password(password)
+    except HashingBusy:
+        return _hashing_busy_response(request, db)
     new_user = models.User(name=name, username=username, password=hashed_pw, role=role)
     db.add(new_user)
     db.commit()
     db.refresh(new_user)
+    invalidate_principal(username)
+    presence_board.user_added()
+    database.note_write(request)
+    return _redirect_with_message(request, "User created successfully")
+
+@router.post("/db-admin/users/import")
+def import_users_submit(request: Request,
+                        file: UploadFile = File(...),
+                        db: Session = Depends(database.get_db)):
+    role_session = request.session.get("role")
+    if role_session != "db_admin":
+        return RedirectResponse("/login", status_code=HTTP_302_FOUND)
 
-    users = db.query(models.User).all()
-    return templates.TemplateResponse(
-        "db_admin.html",
-        {"request": request, "users": users, "success": "User created successfully"}
+    try:
+        rows = parse_user_rows(file.file.read(), file.filename or "")
+    except ImportFormatError as exc:
+        return _db_admin_page(request, db, error=str(exc), status_code=400)
+
+    try:
+        report = import_users(db, rows)
+    except HashingBusy:
+        return _hashing_busy_response(request, db)
+    invalidate_principal(*report["created"])
+    presence_board.user_added(len(report["created"]))
+    database.note_write(request)
+    if not report["errors"]:
+        return _redirect_with_message(request, f"Imported {len(report['created'])} of {report['total']} users")
+    # The per-row error report is too large for the session cookie, so render it here
+    return _db_admin_page(
+        request, db, import_report=report,
+        success=f"Imported {len(report['created'])} of {report['total']} users",
     )
 
 @router.get("/db-admin/users/{user_id}/edit")
@@ -201,26 +357,24 @@ def update_user(request: Request,
     # Prevent duplicate username on update
     existing = db.query(models.User).filter(models.User.username == username, models.User.id != user_id).first()
     if existing:
-        users = db.query(models.User).all()
-        return templates.TemplateResponse(
-            "db_admin.html",
-            {"request": request, "users": users, "error": f"Username '{username}' is taken by another user"}
-        )
+        return _db_admin_page(request, db, error=f"Username '{username}' is taken by another user")
 
+    previous_username, previous_role = user.username, user.role
     user.name = name
     user.username = username
     user.role = role
 
     # Only update password if provided (cannot show original; it’s hashed)
     if password.strip():
-        hashed_pw = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-        user.password = hashed_pw
+        try:
+            user.password = hash_password(password)
+        except HashingBusy:
+            return _hashing_busy_response(request, db)
 
     db.commit()
     db.refresh(user)
-
-    users = db.query(models.User).all()
-    return templates.TemplateResponse(
-        "db_admin.html",
-        {"request": request, "users": users, "success": "User updated successfully"}
-    )
+    invalidate_principal(previous_username, username)
+    if role != previous_role:
+        attendance_stats.clear()  # cached days group this user under the old role
+    database.note_write(request)
+    return _redirect_with_message(request, "User updated successfully")
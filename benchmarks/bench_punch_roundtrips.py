@@ -0,0 +1,117 @@
+"""
+Compare database round trips and latency of the old ORM punch path
+(lookup, add/modify, commit, refresh) with the single-statement
+INSERT/UPDATE ... RETURNING path used by the clock-in/out handlers.
+
+    python benchmarks/bench_punch_roundtrips.py --users 200 --repeat 5
+
+Statements are counted per punch with a cursor event; on a networked
+database each one is a round trip.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="each user clocks in and out once per repeat")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from sqlalchemy import event, insert
+    from app.database import Base, SessionLocal, engine
+    from app.models import AttendanceLog, User
+    from app.punches import attendance_out, clock_in_stmt, clock_out_stmt
+    from app.rollups import record_clock_in, record_clock_out
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.execute(insert(User), [
+        {"id": i, "name": f"Bench {i}", "username": f"bench{i}", "password": "x", "role": "staff"}
+        for i in range(1, args.users + 1)
+    ])
+    db.commit()
+    db.close()
+
+    statements = [0]
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements[0] += 1
+
+    def orm_in(s, user_id: int):
+        # What the handlers did before
+        user = s.query(User).filter(User.id == user_id).first()
+        entry = AttendanceLog(user_id=user.id, clock_in=datetime.utcnow(), latitude_in=5.6695, longitude_in=-0.196)
+        s.add(entry)
+        record_clock_in(s, entry.user_id, entry.clock_in)
+        s.commit()
+        s.refresh(entry)
+        return entry.id
+
+    def orm_out(s, user_id: int):
+        entry = (
+            s.query(AttendanceLog)
+            .filter(AttendanceLog.user_id == user_id, AttendanceLog.clock_out == None)
+            .order_by(AttendanceLog.clock_in.desc())
+            .first()
+        )
+        entry.clock_out = datetime.utcnow()
+        entry.latitude_out, entry.longitude_out = 5.6695, -0.196
+        record_clock_out(s, entry.user_id, entry.clock_in, entry.clock_out)
+        s.commit()
+        s.refresh(entry)
+        return entry.id
+
+    def returning_in(s, user_id: int):
+        now = datetime.utcnow()
+        row = s.execute(clock_in_stmt(user_id, now, 5.6695, -0.196, None)).first()
+        record_clock_in(s, user_id, now)
+        s.commit()
+        return attendance_out(row).attendance_id
+
+    def returning_out(s, user_id: int):
+        entry = attendance_out(s.execute(clock_out_stmt(user_id, datetime.utcnow(), 5.6695, -0.196, None)).first())
+        record_clock_out(s, entry.user_id, entry.clock_in, entry.clock_out)
+        s.commit()
+        return entry.attendance_id
+
+    results = {}
+    for name, clock_in, clock_out in (("orm", orm_in, orm_out), ("returning", returning_in, returning_out)):
+        per_punch = {"in": [], "out": []}
+        counts = {"in": 0, "out": 0}
+        for _ in range(args.repeat):
+            for kind, fn in (("in", clock_in), ("out", clock_out)):
+                for user_id in range(1, args.users + 1):
+                    s = SessionLocal()
+                    before = statements[0]
+                    t0 = time.perf_counter()
+                    fn(s, user_id)
+                    per_punch[kind].append(time.perf_counter() - t0)
+                    counts[kind] += statements[0] - before
+                    s.close()
+        punches = args.users * args.repeat
+        results[name] = {
+            kind: {
+                "statements_per_punch": counts[kind] / punches,
+                "median_ms": statistics.median(per_punch[kind]) * 1000,
+            }
+            for kind in ("in", "out")
+        }
+    for kind in ("in", "out"):
+        results[f"statements_saved_per_clock_{kind}"] = (
+            results["orm"][kind]["statements_per_punch"] - results["returning"][kind]["statements_per_punch"]
+        )
+    print(json.dumps({"users": args.users, "repeat": args.repeat, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
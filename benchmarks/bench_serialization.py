@@ -0,0 +1,84 @@
+"""
+Compare the ORM + Pydantic list path with the column-tuple + orjson fast path
+used by the attendance list endpoints.
+
+    python benchmarks/bench_serialization.py --rows 50000 --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    from fastapi.encoders import jsonable_encoder
+    from sqlalchemy import insert
+    from app.database import Base, SessionLocal, engine
+    from app.fastjson import ATTENDANCE_COLUMNS, attendance_list_response
+    from app.models import AttendanceLog, User
+    from app.schemas import AttendanceLogList, AttendanceOut
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(User(id=1, name="Bench", username="bench", password="x", role="staff"))
+    start = datetime(2024, 1, 1, 8)
+    db.execute(insert(AttendanceLog), [
+        {"user_id": 1, "clock_in": start + timedelta(minutes=i), "clock_out": start + timedelta(minutes=i, hours=8),
+         "latitude_in": 5.6695, "longitude_in": -0.196, "latitude_out": 5.6695, "longitude_out": -0.196}
+        for i in range(args.rows)
+    ])
+    db.commit()
+
+    def orm_path() -> bytes:
+        # What the endpoints did before: hydrate ORM rows, copy into models,
+        # then let FastAPI validate and encode the response_model.
+        s = SessionLocal()
+        logs = s.query(AttendanceLog).order_by(AttendanceLog.clock_in.desc()).all()
+        items = [
+            AttendanceOut(
+                attendance_id=l.id, user_id=l.user_id, clock_in=l.clock_in, clock_out=l.clock_out,
+                latitude_in=l.latitude_in, longitude_in=l.longitude_in,
+                latitude_out=l.latitude_out, longitude_out=l.longitude_out,
+                site_id_in=l.site_id_in, site_id_out=l.site_id_out,
+            )
+            for l in logs
+        ]
+        validated = AttendanceLogList.model_validate(AttendanceLogList(items=items).model_dump())
+        body = json.dumps(jsonable_encoder(validated), separators=(",", ":")).encode()
+        s.close()
+        return body
+
+    def fast_path() -> bytes:
+        s = SessionLocal()
+        rows = s.query(*ATTENDANCE_COLUMNS).order_by(AttendanceLog.clock_in.desc()).all()
+        body = attendance_list_response(rows).body
+        s.close()
+        return body
+
+    assert json.loads(orm_path()) == json.loads(fast_path()), "fast path changed the response"
+
+    results = {}
+    for name, fn in (("orm_pydantic", orm_path), ("columns_orjson", fast_path)):
+        timings = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - t0)
+        results[name] = {"median_s": statistics.median(timings), "min_s": min(timings)}
+    results["speedup"] = results["orm_pydantic"]["median_s"] / results["columns_orjson"]["median_s"]
+    print(json.dumps({"rows": args.rows, "repeat": args.repeat, **results}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+In-process load test for the punch, dashboard and report paths.
+
+Seeds a database with --users staff accounts and --years of closed punches,
+then drives app.main.app over ASGI (no network, no server) through:
+
+  storm      every staff user logs in and clocks in (the 7:55am rush)
+  wave       every staff user clocks out
+  reports    large report, export and history calls from an admin
+  polling    admin dashboard polls run alongside storm and wave
+
+Per-endpoint counts, errors, throughput and p50/p95/p99 latency are written
+as JSON so runs can be compared:
+
+    python benchmarks/loadtest.py --users 300 --years 2 --output run.json
+    python benchmarks/loadtest.py --compare base.json run.json --threshold 0.2
+
+Pass --database-url to run against PostgreSQL instead of a temporary SQLite file.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+PASSWORD = "loadtest-pass"
+INSTITUTION = {"latitude": "5.669533", "longitude": "-0.196003"}
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class Recorder:
+    def __init__(self):
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    async def call(self, client, method: str, url: str, name: str | None = None, ok=(200, 302), **kwargs):
+        t0 = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        await response.aread()
+        key = name or f"{method} {url}"
+        self.samples[key].append(time.perf_counter() - t0)
+        if response.status_code not in ok:
+            self.errors[key] += 1
+        return response
+
+    def report(self, wall_seconds: float) -> dict:
+        endpoints = {}
+        for key, values in sorted(self.samples.items()):
+            values = sorted(values)
+            endpoints[key] = {
+                "count": len(values),
+                "errors": self.errors.get(key, 0),
+                "throughput_rps": round(len(values) / wall_seconds, 2) if wall_seconds else None,
+                "p50_ms": round(percentile(values, 50) * 1000, 2),
+                "p95_ms": round(percentile(values, 95) * 1000, 2),
+                "p99_ms": round(percentile(values, 99) * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+            }
+        total = sum(len(v) for v in self.samples.values())
+        return {
+            "wall_s": round(wall_seconds, 3),
+            "requests": total,
+            "throughput_rps": round(total / wall_seconds, 2) if wall_seconds else None,
+            "endpoints": endpoints,
+        }
+
+def seed(users: int, years: int, admins: int) -> dict:
+    from sqlalchemy import insert
+    from app.database import SessionLocal
+    from app.models import AttendanceLog, User
+    from app.rollups import backfill
+    from app.security import hash_password
+
+    hashed = hash_password(PASSWORD)  # one bcrypt hash shared by every account keeps seeding fast
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"name": f"Staff {i}", "username": f"staff{i}", "password": hashed, "role": "staff"}
+            for i in range(users)
+        ] + [
+            {"name": f"Admin {i}", "username": f"admin{i}", "password": hashed, "role": "admin"}
+            for i in range(admins)
+        ])
+        staff_ids = [uid for (uid,) in db.query(User.id).filter(User.role == "staff").order_by(User.id)]
+
+        # One closed session per staff user per weekday, ending yesterday
+        today = datetime.utcnow().date()
+        day = today - timedelta(days=365 * years)
+        rows, written = [], 0
+        while day < today:
+            if day.weekday() < 5:
+                for n, uid in enumerate(staff_ids):
+                    clock_in = datetime.combine(day, datetime.min.time()) + timedelta(hours=7, minutes=40 + n % 40)
+                    rows.append({
+                        "user_id": uid, "clock_in": clock_in, "clock_out": clock_in + timedelta(hours=8, minutes=n % 50),
+                        "latitude_in": 5.669533, "longitude_in": -0.196003,
+                        "latitude_out": 5.669533, "longitude_out": -0.196003,
+                    })
+            if len(rows) >= 20000:
+                db.execute(insert(AttendanceLog), rows)
+                written += len(rows)
+                rows = []
+            day += timedelta(days=1)
+        if rows:
+            db.execute(insert(AttendanceLog), rows)
+            written += len(rows)
+        db.commit()
+        backfill(db)
+        return {"staff": len(staff_ids), "admins": admins, "punches": written}
+    finally:
+        db.close()
+
+async def run(args) -> dict:
+    import httpx
+    from app.dependencies import API_PREFIX
+    from app.main import app
+
+    limits = asyncio.Semaphore(args.concurrency)
+    results: dict = {}
+
+    def web_client():
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest")
+
+    async with app.router.lifespan_context(app):
+        staff = [web_client() for _ in range(args.users)]
+        admin = web_client()
+        # Report calls keep their unprefixed names; the base URL adds the JSON API prefix
+        api_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url=f"http://loadtest{API_PREFIX}")
+        try:
+            polling_rec = Recorder()
+            await polling_rec.call(admin, "POST", "/login", data={"username": "admin0", "password": PASSWORD})
+
+            async def poll(stop: asyncio.Event):
+                while not stop.is_set():
+                    await polling_rec.call(admin, "GET", "/web/admin")
+                    try:
+                        await asyncio.wait_for(stop.wait(), args.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+
+            async def phase(name: str, per_user):
+                rec = Recorder()
+                stop = asyncio.Event()
+                pollers = [asyncio.create_task(poll(stop)) for _ in range(args.pollers)]
+
+                async def one(i: int, client):
+                    async with limits:
+                        await per_user(rec, i, client)
+
+                t0 = time.perf_counter()
+                await asyncio.gather(*(one(i, c) for i, c in enumerate(staff)))
+                wall = time.perf_counter() - t0
+                stop.set()
+                await asyncio.gather(*pollers)
+                results[name] = rec.report(wall)
+
+            async def storm(rec, i, client):
+                await rec.call(client, "POST", "/login", data={"username": f"staff{i}", "password": PASSWORD})
+                await rec.call(client, "POST", "/attendance/clock-in", data=INSTITUTION)
+                await rec.call(client, "GET", "/web/dashboard")
+
+            async def wave(rec, i, client):
+                await rec.call(client, "POST", "/attendance/clock-out", data=INSTITUTION)
+
+            t0 = time.perf_counter()
+            await phase("storm", storm)
+            await phase("wave", wave)
+            results["polling"] = polling_rec.report(time.perf_counter() - t0)
+
+            rec = Recorder()
+            token = (await api_client.post(
+                "/users/token", data={"username": "admin0", "password": PASSWORD}
+            )).json()["access_token"]
+            headers = {"Authorization": f"Bearer {token}"}
+            today = datetime.utcnow().date()
+            start = (today - timedelta(days=365 * args.years)).isoformat()
+            last_month = (today - timedelta(days=30)).isoformat()
+            t0 = time.perf_counter()
+            for _ in range(args.report_repeat):
+                await rec.call(api_client, "POST", "/reports/daily-summary", ok=(200,), headers=headers,
+                               json={"date": (today - timedelta(days=1)).isoformat()})
+                await rec.call(api_client, "POST", "/reports/export-csv/range", ok=(200,), headers=headers,
+                               json={"start_date": last_month, "end_date": today.isoformat()}, name="POST /reports/export-csv/range (30d)")
+                await rec.call(api_client, "POST", "/reports/export-csv/range", ok=(200,), headers=headers,
+                               json={"start_date": start, "end_date": today.isoformat(), "gzip": True},
+                               name="POST /reports/export-csv/range (all, gzip)")
+                await rec.call(api_client, "POST", "/reports/export-columnar", ok=(200,), headers=headers,
+                               json={"start_date": start, "end_date": today.isoformat()},
+                               name="POST /reports/export-columnar (all)")
+                await rec.call(api_client, "POST", "/reports/rollups/totals", ok=(200,), headers=headers,
+                               json={"start_date": start, "end_date": today.isoformat()})
+                await rec.call(api_client, "GET", "/attendance/logs?limit=500", ok=(200,), headers=headers)
+                await rec.call(api_client, "GET", "/attendance/logs/1?limit=500", ok=(200,), headers=headers)
+            results["reports"] = rec.report(time.perf_counter() - t0)
+        finally:
+            for client in staff + [admin, api_client]:
+                await client.aclose()
+    return results
+
+def compare(base_path: str, run_path: str, threshold: float) -> int:
+    """Print p95 changes per endpoint; exit non-zero if any grew by more than `threshold`."""
+    with open(base_path) as f:
+        base = json.load(f)["scenarios"]
+    with open(run_path) as f:
+        current = json.load(f)["scenarios"]
+    regressions = 0
+    for scenario, data in current.items():
+        for endpoint, stats in data["endpoints"].items():
+            old = base.get(scenario, {}).get("endpoints", {}).get(endpoint)
+            if not old or not old["p95_ms"]:
+                continue
+            change = stats["p95_ms"] / old["p95_ms"] - 1
+            flag = "REGRESSION" if change > threshold else ""
+            regressions += bool(flag)
+            print(f"{scenario:8} {endpoint:48} p95 {old['p95_ms']:>9.2f} -> {stats['p95_ms']:>9.2f} ms {change:+7.1%} {flag}")
+    return 1 if regressions else 0
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200, help="staff accounts (one virtual client each)")
+    parser.add_argument("--admins", type=int, default=1)
+    parser.add_argument("--years", type=int, default=1, help="years of seeded history")
+    parser.add_argument("--concurrency", type=int, default=50, help="staff requests in flight at once")
+    parser.add_argument("--pollers", type=int, default=2, help="admin dashboards polling during storm and wave")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="seconds between polls")
+    parser.add_argument("--report-repeat", type=int, default=3)
+    parser.add_argument("--database-url", help="defaults to a temporary SQLite file; must point at an empty database")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "RUN"), help="compare two result files and exit")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p95 growth counted as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'loadtest.db')}"
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.chdir(sys.path[0])  # app.main mounts app/web/static relative to the repo root
+
+    from app.config import settings
+    from app.database import engine
+    from app.schema import ensure_schema
+
+    ensure_schema(engine)
+
+    t0 = time.perf_counter()
+    seeded = seed(args.users, args.years, args.admins)
+    seed_seconds = time.perf_counter() - t0
+
+    scenarios = asyncio.run(run(args))
+    output = {
+        "started_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "database": os.environ["DATABASE_URL"].split(":", 1)[0],
+            "punch_group_commit": settings.PUNCH_GROUP_COMMIT,
+            "db_async": settings.DB_ASYNC,
+            "hash_executor": settings.HASH_EXECUTOR,
+        },
+        "config": {k: v for k, v in vars(args).items() if k not in {"compare", "threshold", "output", "database_url"}},
+        "seed": {**seeded, "seconds": round(seed_seconds, 2)},
+        "scenarios": scenarios,
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
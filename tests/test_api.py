@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+from app.models import User
+from app.security import hash_password
+
+def test_json_api_is_mounted_under_api_prefix(db):
+    db.add(User(id=1, name="Staff", username="staff", password=hash_password("secret1"), role="staff"))
+    db.commit()
+    with TestClient(app) as client:
+        token = client.post("/api/users/token", data={"username": "staff", "password": "secret1"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        assert client.get("/api/users/me", headers=headers).json()["username"] == "staff"
+        punch = {"user_id": 1, "latitude": settings.INSTITUTION_LAT, "longitude": settings.INSTITUTION_LON}
+        response = client.post("/api/attendance/clock-in", json=punch, headers=headers)
+        assert response.status_code == 200, response.text
+        assert client.post("/api/attendance/clock-in", json=punch, headers=headers).status_code == 409
+        assert client.post("/api/attendance/clock-out", json=punch, headers=headers).status_code == 200
+
+def test_sites_are_managed_through_the_api(db):
+    db.add(User(id=1, name="Admin", username="admin", password=hash_password("secret1"), role="admin"))
+    db.commit()
+    with TestClient(app) as client:
+        token = client.post("/api/users/token", data={"username": "admin", "password": "secret1"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        site = {"name": "Annex", "kind": "circle", "latitude": 5.6, "longitude": -0.2}
+        too_big = client.post("/api/sites/", json={**site, "radius_m": settings.SITE_MAX_RADIUS_M + 1}, headers=headers)
+        assert too_big.status_code == 400
+        assert client.post("/api/sites/", json={**site, "radius_m": 100}, headers=headers).status_code == 200
+        assert [s["name"] for s in client.get("/api/sites/", headers=headers).json()["items"]] == ["Annex"]
+
+def test_offline_sync_is_reachable_and_replay_safe(db):
+    db.add(User(id=1, name="Tablet", username="tablet", password=hash_password("secret1"), role="staff"))
+    db.commit()
+    with TestClient(app) as client:
+        token = client.post("/api/users/token", data={"username": "tablet", "password": "secret1"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        here = {"latitude": settings.INSTITUTION_LAT, "longitude": settings.INSTITUTION_LON}
+        batch = {"punches": [
+            {"user_id": 1, "kind": "in", "timestamp": "2025-03-03T08:00:00Z", **here},
+            {"user_id": 1, "kind": "out", "timestamp": "2025-03-03T16:00:00Z", **here},
+        ]}
+        first = client.post("/api/attendance/sync", json=batch, headers=headers)
+        assert first.status_code == 200, first.text
+        assert [r["status"] for r in first.json()["results"]] == ["created", "closed"]
+        replay = client.post("/api/attendance/sync", json=batch, headers=headers).json()
+        assert [r["status"] for r in replay["results"]] == ["duplicate", "duplicate"]
+
+def test_change_feed_pages_past_its_cursor(db):
+    db.add(User(id=1, name="Admin", username="admin", password=hash_password("secret1"), role="admin"))
+    db.commit()
+    with TestClient(app) as client:
+        token = client.post("/api/users/token", data={"username": "admin", "password": "secret1"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        first = client.get("/api/changes", headers=headers).json()
+        assert [item["kind"] for item in first["items"]] == ["user"]
+        assert client.get("/api/changes", params={"since": first["next_cursor"]}, headers=headers).json()["items"] == []
+
+        punch = {"user_id": 1, "latitude": settings.INSTITUTION_LAT, "longitude": settings.INSTITUTION_LON}
+        client.post("/api/attendance/clock-in", json=punch, headers=headers)
+        later = client.get("/api/changes", params={"since": first["next_cursor"]}, headers=headers).json()
+        assert [item["kind"] for item in later["items"]] == ["attendance"]
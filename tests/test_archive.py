@@ -0,0 +1,31 @@
+from datetime import date, datetime
+from app.archive import archive_month, archived_ids, attendance_source
+from app.models import ArchiveSegment, AttendanceArchive, AttendanceLog, User
+from app.punch_sync import _insert_ins
+
+def test_archive_month_moves_closed_rows_and_sync_sees_them(db):
+    db.add(User(id=1, name="Old", username="old", password="x", role="staff"))
+    db.add_all([
+        AttendanceLog(user_id=1, clock_in=datetime(2024, 1, 2, 8), clock_out=datetime(2024, 1, 2, 16)),
+        AttendanceLog(user_id=1, clock_in=datetime(2024, 1, 3, 8), clock_out=datetime(2024, 1, 3, 17)),
+        AttendanceLog(user_id=1, clock_in=datetime(2024, 1, 4, 8)),
+    ])
+    db.commit()
+
+    assert archive_month(db, date(2024, 1, 1)) == 2
+    assert db.query(AttendanceLog).count() == 1
+    assert db.query(AttendanceArchive).count() == 2
+    segment = db.get(ArchiveSegment, date(2024, 1, 1))
+    assert (segment.row_count, segment.first_clock_in) == (2, datetime(2024, 1, 2, 8))
+
+    key = (1, datetime(2024, 1, 2, 8))
+    assert list(archived_ids(db, [key, (1, datetime(2024, 1, 5, 8))])) == [key]
+
+    # A replayed offline clock-in of an archived session is a duplicate, not a new hot row
+    results = {}
+    row = {"user_id": 1, "clock_in": key[1], "latitude_in": None, "longitude_in": None, "site_id_in": None,
+           "clock_out": datetime(2024, 1, 2, 16), "latitude_out": None, "longitude_out": None, "site_id_out": None}
+    assert _insert_ins(db, [(0, row)], results) == {}
+    assert results[0].status == "duplicate"
+    source = attendance_source(db, datetime(2024, 1, 1), datetime(2024, 2, 1))
+    assert db.query(source).count() == 3
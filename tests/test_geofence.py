@@ -0,0 +1,19 @@
+from app.config import settings
+from app.database import SessionLocal
+from app.geofence import Geofences
+from app.models import Site
+
+def test_index_picks_up_sites_changed_by_another_worker(db, monkeypatch):
+    monkeypatch.setattr(settings, "GEOFENCE_REFRESH_SECONDS", 0)
+    worker = Geofences()
+    assert worker.match(6.0, 1.0, SessionLocal) is None
+
+    # Written directly, as another worker's admin request would
+    site = Site(name="Annex", kind="circle", latitude=6.0, longitude=1.0, radius_m=100, active=True)
+    db.add(site)
+    db.commit()
+    assert worker.match(6.0, 1.0, SessionLocal).name == "Annex"
+
+    site.active = False
+    db.commit()
+    assert worker.match(6.0, 1.0, SessionLocal) is None
@@ -0,0 +1,22 @@
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+from app.models import User
+from app.security import hash_password
+
+def test_metrics_are_closed_without_a_token(db, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "")
+    db.add(User(id=1, name="Admin", username="admin", password=hash_password("secret1"), role="admin"))
+    db.commit()
+    with TestClient(app) as client:
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics/slow-queries").status_code == 401
+        client.post("/login", data={"username": "admin", "password": "secret1"})
+        assert client.get("/metrics").status_code == 200
+        assert client.get("/metrics/slow-queries").status_code == 200
+
+def test_metrics_token_is_required_when_configured(db, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scrape-me")
+    with TestClient(app) as client:
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer scrape-me"}).status_code == 200
@@ -0,0 +1,14 @@
+from datetime import datetime
+from app.models import AttendanceLog, User
+from app.punch_ingest import GroupCommitWriter
+
+def test_submit_after_stop_writes_directly_without_restarting(db):
+    db.add(User(id=1, name="Late", username="late", password="x", role="staff"))
+    db.commit()
+    writer = GroupCommitWriter(max_rows=10, window_ms=1)
+    writer.start()
+    writer.stop(timeout=5)
+
+    row_id = writer.submit({"user_id": 1, "clock_in": datetime(2025, 3, 3, 8)}).result(timeout=5)
+    assert writer._thread is None
+    assert db.get(AttendanceLog, row_id).user_id == 1
@@ -0,0 +1,48 @@
+from datetime import datetime, timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import inspect, text
+from app.config import settings
+from app.database import engine
+from app.main import app
+from app.models import AttendanceLog, SchemaVersion, User
+from app.punches import ALREADY_CLOCKED_IN
+from app.schema import ensure_schema
+from app.security import hash_password
+
+def _forgot_to_clock_out_yesterday(db):
+    db.add(User(id=1, name="Staff", username="staff", password=hash_password("secret1"), role="staff"))
+    db.add(AttendanceLog(user_id=1, clock_in=datetime.utcnow() - timedelta(days=1)))
+    db.commit()
+
+def test_web_clock_in_after_a_stale_open_session(db):
+    _forgot_to_clock_out_yesterday(db)
+    with TestClient(app) as client:
+        client.post("/login", data={"username": "staff", "password": "secret1"})
+        page = client.post("/attendance/clock-in").text
+        assert "Working" in page and ALREADY_CLOCKED_IN not in page
+        assert db.query(AttendanceLog).count() == 2
+
+        # A second press today is refused, and says so
+        assert ALREADY_CLOCKED_IN in client.post("/attendance/clock-in").text
+        assert db.query(AttendanceLog).count() == 2
+
+def test_api_clock_in_after_a_stale_open_session(db):
+    _forgot_to_clock_out_yesterday(db)
+    with TestClient(app) as client:
+        token = client.post("/api/users/token", data={"username": "staff", "password": "secret1"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        punch = {"user_id": 1, "latitude": settings.INSTITUTION_LAT, "longitude": settings.INSTITUTION_LON}
+        assert client.post("/api/attendance/clock-in", json=punch, headers=headers).status_code == 200
+        assert client.post("/api/attendance/clock-in", json=punch, headers=headers).status_code == 409
+
+def test_upgrade_replaces_the_per_user_open_session_index(db):
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX uq_attendance_open_day_sqlite"))
+        conn.execute(text(
+            "CREATE UNIQUE INDEX uq_attendance_open_session ON attendance_logs (user_id) WHERE clock_out IS NULL"
+        ))
+    db.add(SchemaVersion(id=1, version=5))
+    db.commit()
+    assert ensure_schema(engine) == 6
+    names = {i["name"] for i in inspect(engine).get_indexes("attendance_logs")}
+    assert "uq_attendance_open_day_sqlite" in names and "uq_attendance_open_session" not in names
@@ -0,0 +1,21 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models import User
+from app.security import hash_password
+
+def _admin_headers(client, db):
+    db.add(User(id=1, name="Admin", username="admin", password=hash_password("secret1"), role="admin"))
+    db.commit()
+    token = client.post("/api/users/token", data={"username": "admin", "password": "secret1"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_csv_range_export_rejects_bad_dates(db):
+    with TestClient(app) as client:
+        headers = _admin_headers(client, db)
+        bad = client.post("/api/reports/export-csv/range", json={"start_date": "2025-13-01"}, headers=headers)
+        assert bad.status_code == 400
+        backwards = client.post("/api/reports/export-csv/range",
+                                json={"start_date": "2025-03-02", "end_date": "2025-03-01"}, headers=headers)
+        assert backwards.status_code == 400
+        ok = client.post("/api/reports/export-csv/range", json={"start_date": "2025-03-01"}, headers=headers)
+        assert ok.status_code == 200
@@ -0,0 +1,19 @@
+from datetime import datetime
+from app.models import AttendanceDaily, AttendanceLog, User
+from app.rollups import record_clock_out
+
+def test_clock_out_of_legacy_session_rebuilds_day_with_pending_change(db):
+    # An open session written before attendance_daily existed has no rollup row
+    db.add(User(id=1, name="Legacy", username="legacy", password="x", role="staff"))
+    log = AttendanceLog(user_id=1, clock_in=datetime(2025, 3, 3, 8))
+    db.add(log)
+    db.commit()
+
+    log.clock_out = datetime(2025, 3, 3, 16)
+    record_clock_out(db, log.user_id, log.clock_in, log.clock_out)
+    db.commit()
+
+    day = db.query(AttendanceDaily).one()
+    assert day.worked_seconds == 8 * 3600
+    assert day.open_sessions == 0
+    assert day.last_out == datetime(2025, 3, 3, 16)
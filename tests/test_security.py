@@ -0,0 +1,13 @@
+import threading
+import pytest
+from app import security
+
+def test_bulk_hashing_uses_the_bounded_pool(monkeypatch):
+    hashes = security.hash_passwords_bulk(["alpha1", "bravo2", "charlie3"])
+    assert [security._verify(p, h) for p, h in zip(["alpha1", "bravo2", "charlie3"], hashes)] == [True] * 3
+    assert security.hash_executor_stats()["in_flight"] == 0
+
+    monkeypatch.setattr(security, "_slots", threading.BoundedSemaphore(1))
+    security._slots.acquire()  # a login holds the only slot
+    with pytest.raises(security.HashingBusy):
+        security.hash_passwords_bulk(["delta4"])
@@ -0,0 +1,19 @@
+from datetime import date, datetime
+from app.models import AttendanceLog, User
+from app.rollups import backfill
+from app.stats import attendance_stats
+
+def test_backfill_invalidates_cached_finished_days(db):
+    attendance_stats.clear()
+    db.add(User(id=1, name="Steady", username="steady", password="x", role="staff"))
+    db.add(AttendanceLog(user_id=1, clock_in=datetime(2025, 3, 3, 8), clock_out=datetime(2025, 3, 3, 12)))
+    db.commit()
+    backfill(db)
+    day = date(2025, 3, 3)
+    assert attendance_stats.compute(db, day, day)["items"][0]["worked_seconds"] == 4 * 3600
+    assert attendance_stats.compute(db, day, day)["cached_days"] == 1
+
+    db.add(AttendanceLog(user_id=1, clock_in=datetime(2025, 3, 3, 13), clock_out=datetime(2025, 3, 3, 17)))
+    db.commit()
+    backfill(db)
+    assert attendance_stats.compute(db, day, day)["items"][0]["worked_seconds"] == 8 * 3600
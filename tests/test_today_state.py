@@ -0,0 +1,14 @@
+from datetime import datetime
+from app.models import AttendanceLog, User
+from app.today_state import RedisBackend, TodayStateCache
+
+def test_unreachable_redis_falls_back_to_the_database(db):
+    db.add(User(id=1, name="Early", username="early", password="x", role="staff"))
+    clock_in = datetime.utcnow().replace(microsecond=0)
+    db.add(AttendanceLog(user_id=1, clock_in=clock_in))
+    db.commit()
+    cache = TodayStateCache()
+    cache._backend = RedisBackend("redis://127.0.0.1:1/0", ttl=60)
+
+    assert cache.get(db, 1)["clock_in"] == clock_in.isoformat()
+    cache.clocked_out(1, clock_in, datetime.utcnow())